@@ -0,0 +1,179 @@
+# app/answer_cache.py
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .models import QueryResult
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, without trailing punctuation"""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.! ")
+
+class _Entry:
+    def __init__(self, result: QueryResult, expires_at: float, scope: Tuple[str, str], has_vector: bool):
+        self.result = result
+        self.expires_at = expires_at
+        self.scope = scope
+        self.has_vector = has_vector
+
+class _ScopeVectors:
+    """Unit question vectors of one scope as rows of a growable matrix
+    
+    Removing a key moves the last row into its slot, so the live rows stay
+    contiguous and a lookup is one matrix-vector product.
+    """
+    
+    def __init__(self, dimension: int):
+        self.matrix = np.empty((8, dimension), dtype=np.float32)
+        self.keys: List[str] = []
+        self.rows: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def add(self, key: str, vector: np.ndarray):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.matrix):
+                grown = np.empty((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.rows[key] = row
+            self.keys.append(key)
+        self.matrix[row] = vector
+    
+    def remove(self, key: str):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last_key = self.keys.pop()
+        if last_key != key:
+            self.matrix[row] = self.matrix[len(self.keys)]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+    
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        return self.matrix[:len(self.keys)] @ query
+
+class AnswerCache:
+    """In-memory answer cache with TTL and LRU size bound
+    
+    Exact entries are keyed on (document content hash, normalized question,
+    retrieved chunk ids, prompt version). Entries that carry a question
+    embedding can also be found by near-duplicate lookup within the same
+    document and prompt version, against a per-scope matrix of question
+    vectors kept in step with the entries.
+    """
+    
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 3600, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._vectors: Dict[Tuple[str, str], _ScopeVectors] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(content_hash: str, question: str, chunk_ids: List[str], prompt_version: str) -> str:
+        payload = "\0".join([content_hash, normalize_question(question), ",".join(chunk_ids), prompt_version])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[QueryResult]:
+        """Exact lookup"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+    
+    def find_similar(self, scope: Tuple[str, str], question_embedding: List[float]) -> Optional[QueryResult]:
+        """Return a cached answer for a near-identical question in the same scope"""
+        if self.similarity_threshold <= 0:
+            return None
+        
+        query = self._unit(question_embedding)
+        if query is None:
+            return None
+        
+        now = time.time()
+        with self._lock:
+            vectors = self._vectors.get(scope)
+            if vectors is None:
+                return None
+            
+            similarities = vectors.similarities(query)
+            close = np.flatnonzero(similarities >= self.similarity_threshold)
+            expired = []
+            found = None
+            for row in close[np.argsort(-similarities[close])]:
+                key = vectors.keys[row]
+                if self._entries[key].expires_at >= now:
+                    found = key
+                    break
+                expired.append(key)
+            for key in expired:
+                self._remove(key)
+            if found is None:
+                return None
+            
+            self._entries.move_to_end(found)
+            self.similar_hits += 1
+            return self._entries[found].result
+    
+    def put(self, key: str, result: QueryResult, scope: Tuple[str, str], question_embedding: Optional[List[float]] = None):
+        """Store an answer, evicting expired and least recently used entries"""
+        vector = self._unit(question_embedding) if question_embedding is not None else None
+        now = time.time()
+        
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(result, now + self.ttl_seconds, scope, vector is not None)
+            if vector is not None:
+                vectors = self._vectors.get(scope)
+                if vectors is None:
+                    vectors = self._vectors[scope] = _ScopeVectors(len(vector))
+                vectors.add(key, vector)
+            
+            if len(self._entries) > self.max_entries:
+                for expired in [k for k, entry in self._entries.items() if entry.expires_at < now]:
+                    self._remove(expired)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: str):
+        """Drop an entry and its question vector (lock held)"""
+        entry = self._entries.pop(key, None)
+        if entry is None or not entry.has_vector:
+            return
+        vectors = self._vectors[entry.scope]
+        vectors.remove(key)
+        if not len(vectors):
+            del self._vectors[entry.scope]
+    
+    @staticmethod
+    def _unit(vector: Optional[List[float]]) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm > 0 else None
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses
+            }
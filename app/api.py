@@ -1,19 +1,74 @@
 # app/api.py
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
 import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 from dotenv import load_dotenv
-from .models import HackathonRequest, HackathonResponse
+from .models import HackathonRequest, HackathonResponse, IngestRequest, IngestResponse, IngestJobStatus
 from .core import RAGSystem
+from .jobs import IngestQueueFull
+from .metrics import REGISTRY, REQUEST_SECONDS, start_request_timings, server_timing_header
 
 # Load environment variables first
 load_dotenv()
 
+# RAG system, constructed in the background at startup (or by the first request that needs it)
+rag_system: Optional[RAGSystem] = None
+rag_system_error: Optional[str] = None
+_rag_system_lock = threading.Lock()
+
+def initialize_rag_system() -> RAGSystem:
+    """Construct the RAG system once; blocking, so call it off the event loop"""
+    global rag_system, rag_system_error
+    with _rag_system_lock:
+        if rag_system is None:
+            try:
+                start = time.perf_counter()
+                rag_system = RAGSystem()
+                rag_system_error = None
+                print(f"RAG system ready in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                rag_system_error = str(e)
+                print(f"Error initializing RAG system: {e}")
+                raise
+        return rag_system
+
+async def get_rag_system() -> RAGSystem:
+    """Dependency that waits for initialization (retrying it after a failure)"""
+    if rag_system is not None:
+        return rag_system
+    try:
+        return await run_in_threadpool(initialize_rag_system)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service is not ready: {str(e)}",
+            headers={"Retry-After": "5"}
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start serving immediately and warm up clients and the vector index in the background"""
+    warmup = asyncio.get_running_loop().run_in_executor(None, initialize_rag_system)
+    warmup.add_done_callback(lambda future: future.exception())
+    yield
+    if rag_system is not None:
+        # Waits for running ingest jobs, so keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, rag_system.close)
+
 app = FastAPI(
     title="LLM-Powered Query-Retrieval System",
     description="RAG system for insurance, legal, HR, and compliance domains",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -28,8 +83,26 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
-# Initialize RAG system - this will now work since .env is loaded
-rag_system = RAGSystem()
+# Per-request stage breakdown in a Server-Timing header (always on, or per request via X-Timing: 1)
+timing_headers = os.getenv("TIMING_HEADERS", "false").lower() == "true"
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """Time each request and optionally expose its stage breakdown"""
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    
+    # Label by route template rather than raw path to keep cardinality bounded
+    endpoint = request.scope.get("endpoint")
+    route = next((r.path for r in app.routes if getattr(r, "endpoint", None) is endpoint), "unmatched")
+    REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    
+    if timing_headers or request.headers.get("x-timing") == "1":
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify the bearer token"""
@@ -45,14 +118,36 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
 async def root():
     return {"message": "LLM-Powered Query-Retrieval System is running!"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus-format metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "rag-system"}
+    """Liveness, plus whether the RAG system is ready to serve queries"""
+    return {
+        "status": "healthy",
+        "service": "rag-system",
+        "ready": rag_system is not None,
+        "error": rag_system_error
+    }
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until clients and the vector index are initialized"""
+    if rag_system is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=rag_system_error or "Initializing"
+        )
+    return {"status": "ready", "vector_store": rag_system.vector_store.name}
 
 @app.post("/hackrx/run", response_model=HackathonResponse)
 async def run_hackrx(
     request: HackathonRequest,
-    token: str = Depends(verify_token)
+    token: str = Depends(verify_token),
+    rag_system: RAGSystem = Depends(get_rag_system)
 ):
     """
     Main endpoint to process documents and answer questions
@@ -71,8 +166,9 @@ async def run_hackrx(
                 detail="At least one question is required"
             )
         
-        # Process questions
-        answers = rag_system.process_questions(
+        # Process off the event loop; the download happens inside the document's single ingest
+        answers = await run_in_threadpool(
+            rag_system.process_questions,
             document_url=request.documents,
             questions=request.questions
         )
@@ -85,11 +181,129 @@ async def run_hackrx(
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/hackrx/run/stream")
+async def run_hackrx_stream(
+    request: HackathonRequest,
+    http_request: Request,
+    stream_tokens: bool = False,
+    token: str = Depends(verify_token),
+    rag_system: RAGSystem = Depends(get_rag_system)
+):
+    """
+    Streaming variant of /hackrx/run: each answer is sent as soon as it is ready
+    
+    Emits NDJSON by default, or Server-Sent Events when the client accepts
+    text/event-stream. Events carry the question index; with
+    stream_tokens=true, generated tokens are streamed as well. A final
+    "done" event follows the last answer.
+    """
+    if not request.documents:
+        raise HTTPException(
+            status_code=400,
+            detail="Document URL is required"
+        )
+    
+    if not request.questions:
+        raise HTTPException(
+            status_code=400,
+            detail="At least one question is required"
+        )
+    
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    def encode(event: dict) -> str:
+        data = json.dumps(event)
+        return f"event: {event['type']}\ndata: {data}\n\n" if sse else data + "\n"
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def emit(event: dict):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        
+        # Answer questions off the event loop; worker threads push events into the queue
+        task = asyncio.ensure_future(run_in_threadpool(
+            rag_system.stream_questions,
+            document_url=request.documents,
+            questions=request.questions,
+            emit=emit,
+            stream_tokens=stream_tokens
+        ))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        answered = 0
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            answered += event["type"] == "answer"
+            yield encode(event)
+        
+        try:
+            await task
+        except Exception as e:
+            yield encode({"type": "error", "detail": f"Internal server error: {str(e)}"})
+        yield encode({"type": "done", "answered": answered})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/v1/documents/ingest", response_model=IngestResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_documents(request: IngestRequest, token: str = Depends(verify_token),
+                           rag_system: RAGSystem = Depends(get_rag_system)):
+    """Queue documents for background indexing so later queries find them ready"""
+    if not request.documents:
+        raise HTTPException(
+            status_code=400,
+            detail="At least one document URL is required"
+        )
+    
+    jobs = []
+    for document_url in request.documents:
+        try:
+            jobs.append(rag_system.ingest_queue.submit(document_url).snapshot())
+        except IngestQueueFull as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{e}; {len(jobs)} of {len(request.documents)} documents were accepted",
+                headers={"Retry-After": "30"}
+            )
+    return IngestResponse(jobs=jobs)
+
+@app.get("/api/v1/jobs", response_model=IngestResponse)
+async def list_jobs(token: str = Depends(verify_token), rag_system: RAGSystem = Depends(get_rag_system)):
+    """Recent ingestion jobs, oldest first"""
+    return IngestResponse(jobs=[job.snapshot() for job in rag_system.ingest_queue.jobs()])
+
+@app.get("/api/v1/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_job(job_id: str, token: str = Depends(verify_token), rag_system: RAGSystem = Depends(get_rag_system)):
+    """Status of one ingestion job"""
+    job = rag_system.ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job.snapshot()
+
 @app.get("/api/v1/status")
-async def get_status(token: str = Depends(verify_token)):
+async def get_status(token: str = Depends(verify_token), rag_system: RAGSystem = Depends(get_rag_system)):
     """Get system status"""
     return {
         "status": "operational",
         "processed_documents": len(rag_system.processed_documents),
-        "index_name": rag_system.index_name
+        "ingesting_documents": len(rag_system.processed_documents.ingesting()),
+        "ingest_jobs": rag_system.ingest_queue.stats(),
+        "vector_store": rag_system.vector_store.name,
+        "index_name": rag_system.index_name,
+        "upstream_circuits": {
+            "embedding": rag_system.upstream.embeddings.breaker.state,
+            "chat": rag_system.upstream.chat.breaker.state
+        },
+        "embedding_cache": rag_system.embedding_cache.stats() if rag_system.embedding_cache else None,
+        "answer_cache": rag_system.answer_cache.stats() if rag_system.answer_cache else None
     }
\ No newline at end of file
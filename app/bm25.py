@@ -0,0 +1,119 @@
+# app/bm25.py
+import math
+import re
+from array import array
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which "
+    "will with does do under any how".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens plus adjacent-word bigrams so exact phrases score higher"""
+    words = [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+    bigrams = [f"{first}_{second}" for first, second in zip(words, words[1:])]
+    return words + bigrams
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked id lists; each list contributes 1 / (k + rank) per id"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """Per-document BM25 inverted index over chunks
+    
+    Chunks are added while the document streams in; freeze() packs the
+    postings into flat uint32 arrays addressed by per-term slices.
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids: List[str] = []
+        self._doc_lengths = array("I")
+        self._building: Optional[Dict[str, List[Tuple[int, int]]]] = {}
+        
+        # Packed postings, filled in by freeze()
+        self._term_slices: Dict[str, Tuple[int, int]] = {}
+        self._postings_docs = np.empty(0, dtype=np.uint32)
+        self._postings_tfs = np.empty(0, dtype=np.uint32)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._avg_length = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+    
+    def add(self, chunk_id: str, text: str):
+        """Index one chunk (before freeze)"""
+        if self._building is None:
+            raise RuntimeError("BM25Index is frozen")
+        
+        position = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        
+        counts: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            self._building.setdefault(token, []).append((position, tf))
+        self._doc_lengths.append(len(tokens))
+    
+    def freeze(self):
+        """Pack postings into contiguous arrays; the index is read-only afterwards"""
+        if self._building is None:
+            return
+        
+        total = sum(len(postings) for postings in self._building.values())
+        docs = np.empty(total, dtype=np.uint32)
+        tfs = np.empty(total, dtype=np.uint32)
+        offset = 0
+        for term, postings in self._building.items():
+            end = offset + len(postings)
+            docs[offset:end] = [doc for doc, _ in postings]
+            tfs[offset:end] = [tf for _, tf in postings]
+            self._term_slices[term] = (offset, end)
+            offset = end
+        
+        self._postings_docs = docs
+        self._postings_tfs = tfs
+        self._lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+        self._avg_length = float(self._lengths.mean()) if len(self._lengths) else 0.0
+        self._building = None
+    
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return (chunk_id, score) pairs for the best-matching chunks"""
+        if self._building is not None:
+            self.freeze()
+        
+        count = len(self.chunk_ids)
+        if count == 0:
+            return []
+        
+        scores = np.zeros(count, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * self._lengths / (self._avg_length or 1.0))
+        
+        for term in set(tokenize(query)):
+            span = self._term_slices.get(term)
+            if span is None:
+                continue
+            docs = self._postings_docs[span[0]:span[1]]
+            tfs = self._postings_tfs[span[0]:span[1]].astype(np.float32)
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+        
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunk_ids[i], float(scores[i])) for i in top]
@@ -0,0 +1,143 @@
+# app/chunk_store.py
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+# File layout: compressed chunk frames, uint64 frame offsets (count + 1), then the trailer
+MAGIC = b"RAGC"
+TRAILER = struct.Struct("<4sBQ")  # magic, codec, chunk count
+ZLIB = 1
+ZSTD = 2
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+class _Reader:
+    """Memory-mapped view of one chunk file"""
+    
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.codec, self.count = TRAILER.unpack_from(self.buffer, len(self.buffer) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError(f"Not a chunk file: {path}")
+        table = len(self.buffer) - TRAILER.size - (self.count + 1) * 8
+        self.offsets = np.frombuffer(self.buffer, dtype="<u8", count=self.count + 1, offset=table)
+        if self.codec == ZSTD:
+            zstandard = _zstandard()
+            if zstandard is None:
+                raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+            self._decompress = lambda frame: zstandard.ZstdDecompressor().decompress(frame)
+        else:
+            self._decompress = zlib.decompress
+    
+    def text(self, index: int) -> Optional[str]:
+        if not 0 <= index < self.count:
+            return None
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self._decompress(self.buffer[start:end]).decode("utf-8")
+
+class ChunkWriter:
+    """Appends chunk texts in chunk_index order; commit() publishes the file"""
+    
+    def __init__(self, path: str, level: int):
+        self.path = path
+        zstandard = _zstandard()
+        if zstandard is not None:
+            self.codec = ZSTD
+            self._compress = zstandard.ZstdCompressor(level=level).compress
+        else:
+            self.codec = ZLIB
+            self._compress = lambda data: zlib.compress(data, min(level, 9))
+        
+        directory = os.path.dirname(path)
+        fd, self._temp_path = tempfile.mkstemp(dir=directory, prefix=".chunks-", suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._offsets = [0]
+    
+    def append(self, text: str):
+        frame = self._compress(text.encode("utf-8"))
+        self._file.write(frame)
+        self._offsets.append(self._offsets[-1] + len(frame))
+    
+    def commit(self):
+        count = len(self._offsets) - 1
+        self._file.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+        self._file.write(TRAILER.pack(MAGIC, self.codec, count))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+    
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+class ChunkStore:
+    """Compressed chunk text on local disk, one file per document version
+    
+    Vector metadata carries only ids; chunk text is hydrated from here after
+    a search. Files are named by doc_id and content hash, so the registry
+    record (which holds the content hash and the chunk_id -> chunk_index
+    manifest) always points at the matching file. Frames are compressed one
+    chunk at a time (zstd when zstandard is installed, zlib otherwise) so
+    any chunk can be read on its own through mmap.
+    """
+    
+    def __init__(self, directory: str, level: int = 3):
+        self.directory = directory or tempfile.mkdtemp(prefix="rag-chunks-")
+        self.level = level
+        self._readers: Dict[Tuple[str, str], _Reader] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, doc_id: str, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{doc_id}.{content_hash[:16]}.chunks")
+    
+    def writer(self, doc_id: str, content_hash: str) -> ChunkWriter:
+        return ChunkWriter(self._path(doc_id, content_hash), self.level)
+    
+    def _reader(self, doc_id: str, content_hash: str) -> Optional[_Reader]:
+        key = (doc_id, content_hash)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                path = self._path(doc_id, content_hash)
+                if not os.path.exists(path):
+                    return None
+                reader = self._readers[key] = _Reader(path)
+            return reader
+    
+    def get(self, doc_id: str, content_hash: str, indexes: List[int]) -> List[Optional[str]]:
+        """Texts for chunk indexes of one document version (None where missing)"""
+        reader = self._reader(doc_id, content_hash)
+        if reader is None:
+            return [None] * len(indexes)
+        return [reader.text(index) for index in indexes]
+    
+    def iter_texts(self, doc_id: str, content_hash: str) -> Iterator[str]:
+        """All chunk texts of a document version, in chunk_index order"""
+        reader = self._reader(doc_id, content_hash)
+        if reader is None:
+            return
+        for index in range(reader.count):
+            yield reader.text(index)
+    
+    def remove_versions(self, doc_id: str, keep: str):
+        """Delete files for other versions of a document (open readers keep working)"""
+        prefix = f"{doc_id}."
+        kept = os.path.basename(self._path(doc_id, keep))
+        with self._lock:
+            for key in [key for key in self._readers if key[0] == doc_id and key[1] != keep]:
+                del self._readers[key]
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(".chunks") and name != kept:
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,228 @@
+# app/chunking.py
+import re
+from typing import List, Tuple, Iterable, Iterator, NamedTuple
+import numpy as np
+
+# Boundary strengths for a break placed before a token
+LINE_BREAK = 1
+SENTENCE_END = 2
+PARAGRAPH_BREAK = 3
+SECTION_HEADING = 4
+
+SENTENCE_PATTERN = re.compile(r"[.!?][\"')\]]*\s+")
+PARAGRAPH_PATTERN = re.compile(r"\n[ \t]*\n\s*")
+LINE_PATTERN = re.compile(r"\n\s*")
+HEADING_PATTERNS = [
+    re.compile(r"^(?:section|clause|article|part|chapter|schedule|annexure)\s+[\w.\-]+", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^\d+(?:\.\d+)*\.?\s+[A-Z][^\n]{0,80}$", re.MULTILINE),
+    re.compile(r"^[A-Z][A-Z0-9 ,&/\-]{4,80}$", re.MULTILINE),
+]
+
+class ChunkSpan(NamedTuple):
+    """A chunk as character offsets into the source text"""
+    start: int
+    end: int
+    token_count: int
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse spaces and tabs, keeping line and paragraph breaks for boundary detection"""
+    text = re.sub(r"[^\S\n]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+class RegexTokenizer:
+    """Dependency-free approximation of BPE token counts
+    
+    Each word or punctuation mark is one unit; long words are weighted as
+    roughly one token per four characters.
+    """
+    
+    name = "regex"
+    pattern = re.compile(r"\w+|[^\w\s]")
+    
+    def spans(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Token start offsets, end offsets and token weights"""
+        matches = [match.span() for match in self.pattern.finditer(text)]
+        if not matches:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        offsets = np.asarray(matches, dtype=np.int64)
+        starts, ends = offsets[:, 0], offsets[:, 1]
+        weights = np.maximum(1, (ends - starts + 3) // 4)
+        return starts, ends, weights
+    
+    def count(self, text: str) -> int:
+        return int(self.spans(text)[2].sum())
+
+class TiktokenTokenizer:
+    """Exact token counts from the embedding model's tiktoken encoding"""
+    
+    name = "tiktoken"
+    
+    def __init__(self, encoding):
+        self.encoding = encoding
+    
+    def spans(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if not tokens:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        starts = np.asarray(offsets, dtype=np.int64)
+        ends = np.append(starts[1:], len(text))
+        return starts, ends, np.ones(len(tokens), dtype=np.int64)
+    
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+def get_tokenizer(model: str):
+    """tiktoken encoding for the model when available, otherwise the regex approximation"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return TiktokenTokenizer(encoding)
+    except Exception:
+        return RegexTokenizer()
+
+class TokenChunker:
+    """Linear-time chunker that packs text into token budgets at natural boundaries
+    
+    Text is tokenized once. Each chunk is closed at the strongest boundary
+    (section heading > paragraph > sentence > line) in the second half of
+    its token window, and the next chunk starts overlap_tokens earlier,
+    snapped forward to a sentence start when one is available.
+    """
+    
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 32, tokenizer=None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer or RegexTokenizer()
+    
+    def chunk(self, text: str) -> List[ChunkSpan]:
+        """Chunk spans as offsets into text"""
+        return [span for span, _ in self._run([text], separator="")]
+    
+    def iter_chunks(self, pages: Iterable[str]) -> Iterator[Tuple[ChunkSpan, str]]:
+        """Stream (span, text) chunks from page texts, normalizing whitespace per page
+        
+        Span offsets refer to the normalized document, with pages joined by a
+        newline. Only the text not yet emitted is held in memory.
+        """
+        cleaned = (normalize_whitespace(page) for page in pages)
+        return self._run((page for page in cleaned if page), separator="\n")
+    
+    def _strengths(self, text: str, starts: np.ndarray, search_from: int) -> np.ndarray:
+        """Boundary strength before each token whose start is at or after search_from"""
+        strengths = np.zeros(len(starts), dtype=np.int8)
+        levels = [
+            (LINE_PATTERN, LINE_BREAK, "end"),
+            (SENTENCE_PATTERN, SENTENCE_END, "end"),
+            (PARAGRAPH_PATTERN, PARAGRAPH_BREAK, "end"),
+        ] + [(pattern, SECTION_HEADING, "start") for pattern in HEADING_PATTERNS]
+        
+        for pattern, level, edge in levels:
+            positions = np.fromiter(
+                (match.end() if edge == "end" else match.start() for match in pattern.finditer(text, search_from)),
+                dtype=np.int64
+            )
+            if len(positions) == 0:
+                continue
+            tokens = np.searchsorted(starts, positions)
+            valid = tokens < len(starts)
+            tokens = tokens[valid]
+            tokens = tokens[starts[tokens] == positions[valid]]
+            strengths[tokens] = np.maximum(strengths[tokens], level)
+        return strengths
+    
+    def _pick_end(self, weights: np.ndarray, strengths: np.ndarray, cursor: int) -> int:
+        """Token index at which to close the chunk starting at cursor (exclusive)"""
+        # Every token weighs at least 1, so max_tokens + 1 tokens always cover the window
+        cumulative = np.cumsum(weights[cursor:cursor + self.max_tokens + 1])
+        fit = int(np.searchsorted(cumulative, self.max_tokens, side="right"))
+        if fit == 0:
+            return cursor + 1
+        if fit >= len(cumulative):
+            return cursor + len(cumulative)
+        
+        # Break before token `cursor + k`, choosing among k in [half, fit]
+        half = max(1, int(np.searchsorted(cumulative, self.max_tokens // 2, side="left")))
+        window = strengths[cursor + half:cursor + fit + 1]
+        if len(window) == 0 or window.max() == 0:
+            return cursor + fit
+        best = window.max()
+        return cursor + half + int(np.flatnonzero(window == best)[-1])
+    
+    def _next_start(self, weights: np.ndarray, strengths: np.ndarray, cursor: int, end: int) -> int:
+        """Start of the following chunk, overlapping the previous one by about overlap_tokens"""
+        if self.overlap_tokens <= 0:
+            return end
+        tail = np.cumsum(weights[cursor:end][::-1])
+        back = int(np.searchsorted(tail, self.overlap_tokens, side="left")) + 1
+        start = max(cursor + 1, end - back)
+        sentence_starts = np.flatnonzero(strengths[start:end] >= SENTENCE_END)
+        if len(sentence_starts):
+            start += int(sentence_starts[0])
+        return start
+    
+    def _run(self, pieces: Iterable[str], separator: str) -> Iterator[Tuple[ChunkSpan, str]]:
+        buffer = ""
+        base = 0  # document offset of buffer[0]
+        starts = ends = weights = np.empty(0, dtype=np.int64)
+        strengths = np.empty(0, dtype=np.int8)
+        cursor = 0
+        remaining = 0  # total weight of tokens from cursor on
+        seen = False
+        
+        def emit(end: int):
+            start_char, end_char = int(starts[cursor]), int(ends[end - 1])
+            raw = buffer[start_char:end_char]
+            text = raw.strip()
+            start_char += len(raw) - len(raw.lstrip())
+            span = ChunkSpan(base + start_char, base + start_char + len(text), int(weights[cursor:end].sum()))
+            return span, text
+        
+        for piece in pieces:
+            offset = len(buffer) + (len(separator) if seen else 0)
+            buffer = f"{buffer}{separator}{piece}" if seen else piece
+            seen = True
+            
+            new_starts, new_ends, new_weights = self.tokenizer.spans(piece)
+            starts = np.concatenate([starts, new_starts + offset])
+            ends = np.concatenate([ends, new_ends + offset])
+            weights = np.concatenate([weights, new_weights])
+            remaining += int(new_weights.sum())
+            # Recompute strengths from a little before the join so boundaries spanning it are seen
+            search_from = max(0, offset - len(separator) - 8)
+            first_new = len(strengths)
+            strengths = np.concatenate([strengths, np.zeros(len(new_starts), dtype=np.int8)])
+            strengths[first_new:] = self._strengths(buffer, starts, search_from)[first_new:]
+            
+            # Emit chunks whose window is complete (more tokens than one budget remain)
+            while remaining > self.max_tokens:
+                end = self._pick_end(weights, strengths, cursor)
+                yield emit(end)
+                next_start = self._next_start(weights, strengths, cursor, end)
+                remaining -= int(weights[cursor:next_start].sum())
+                cursor = next_start
+            
+            # Drop text and tokens that no later chunk can include
+            if cursor > 0:
+                cut = int(starts[cursor]) if cursor < len(starts) else len(buffer)
+                buffer = buffer[cut:]
+                base += cut
+                starts, ends = starts[cursor:] - cut, ends[cursor:] - cut
+                weights, strengths = weights[cursor:], strengths[cursor:]
+                cursor = 0
+        
+        while cursor < len(starts):
+            end = self._pick_end(weights, strengths, cursor)
+            yield emit(end)
+            if end >= len(starts):
+                break
+            cursor = self._next_start(weights, strengths, cursor, end)
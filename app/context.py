@@ -0,0 +1,103 @@
+# app/context.py
+from typing import Callable, List, Optional
+from .models import VectorMatch
+
+class _Passage:
+    """Contiguous document text assembled from one or more retrieved chunks"""
+    
+    def __init__(self, rank: int, text: str, chunk_index: Optional[int], start: Optional[int], end: Optional[int]):
+        self.rank = rank
+        self.text = text
+        self.chunk_index = chunk_index
+        self.start = start
+        self.end = end
+
+def _join_overlapping(left: str, right: str, probe: int = 8) -> str:
+    """Concatenate two texts, dropping the longest suffix of left that starts right"""
+    head = right[:probe]
+    position = left.find(head, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return left + right[len(left) - position:]
+        position = left.find(head, position + 1)
+    return f"{left} {right}"
+
+def _merge_by_offsets(passages: List[_Passage]) -> List[_Passage]:
+    """Merge passages whose document spans overlap or are separated only by whitespace"""
+    merged: List[_Passage] = []
+    for passage in sorted(passages, key=lambda p: p.start):
+        current = merged[-1] if merged else None
+        if current is None or passage.start > current.end + 2:
+            merged.append(passage)
+            continue
+        if passage.end > current.end:
+            overlap = current.end - passage.start
+            if overlap >= 0:
+                current.text += passage.text[overlap:]
+            else:
+                current.text += (" " if overlap == -1 else "\n\n") + passage.text
+            current.end = passage.end
+        current.rank = min(current.rank, passage.rank)
+    return merged
+
+def _merge_by_index(passages: List[_Passage]) -> List[_Passage]:
+    """Merge passages from consecutive chunks, removing the text they share"""
+    merged: List[_Passage] = []
+    for passage in sorted(passages, key=lambda p: p.chunk_index):
+        current = merged[-1] if merged else None
+        if current is None or passage.chunk_index > current.chunk_index + 1:
+            merged.append(passage)
+            continue
+        if passage.chunk_index == current.chunk_index + 1:
+            current.text = _join_overlapping(current.text, passage.text)
+            current.chunk_index = passage.chunk_index
+        current.rank = min(current.rank, passage.rank)
+    return merged
+
+def _truncate(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Cut text at a word boundary so it fits max_tokens"""
+    cut = min(len(text), max_tokens * 4)
+    while cut > 0 and count_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    space = text.rfind(" ", 0, cut)
+    return text[:space if space > cut // 2 else cut]
+
+def pack_context(matches: List[VectorMatch], max_tokens: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """Assemble retrieved chunks into non-redundant passages that fit a token budget
+    
+    Chunks are merged with their neighbours using document offsets (start,
+    end) when present and chunk_index otherwise, so overlapping text appears
+    once. Passages keep the rank of their most relevant chunk and are added
+    most relevant first while they fit; if even the best passage is too
+    long it is truncated.
+    """
+    with_offsets, with_index, others = [], [], []
+    seen = set()
+    for rank, match in enumerate(matches):
+        metadata = match.metadata or {}
+        text = metadata.get('text')
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        passage = _Passage(rank, text, metadata.get('chunk_index'), metadata.get('start'), metadata.get('end'))
+        if passage.start is not None and passage.end is not None:
+            with_offsets.append(passage)
+        elif passage.chunk_index is not None:
+            with_index.append(passage)
+        else:
+            others.append(passage)
+    
+    passages = _merge_by_offsets(with_offsets) + _merge_by_index(with_index) + others
+    passages.sort(key=lambda p: p.rank)
+    
+    packed = []
+    used = 0
+    for passage in passages:
+        tokens = count_tokens(passage.text)
+        if used + tokens <= max_tokens:
+            packed.append(passage.text)
+            used += tokens
+        elif not packed:
+            packed.append(_truncate(passage.text, max_tokens, count_tokens))
+            used = max_tokens
+    return packed
@@ -1,275 +1,1026 @@
 # app/core.py
+import itertools
+import json
 import os
-from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Any
-from .utils import download_pdf, extract_text_from_pdf, create_document_id, chunk_text, clean_text
-from .models import DocumentChunk, QueryResult
+from collections import deque, OrderedDict
+import multiprocessing
+import threading
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable, Union
+from .utils import iter_pdf_pages, iter_pdf_pages_parallel, count_pdf_pages, create_document_id, batch_for_embedding, hash_chunk, estimate_tokens
+from .models import DocumentChunk, QueryResult, VectorMatch
+from .embedding_cache import EmbeddingCache
+from .fallback_embedding import HashedNgramEmbedder
+from .fetcher import DocumentFetcher
+from .chunking import TokenChunker, ChunkSpan, get_tokenizer
+from .vector_store import VectorStore, PineconeVectorStore, LocalVectorStore
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .singleflight import SingleFlight
+from .jobs import IngestQueue, IngestQueueFull
+from .registry import DocumentRegistry
+from .chunk_store import ChunkStore
+from .answer_cache import AnswerCache
+from .upstream import UpstreamClient, Endpoint, CircuitOpen, retryable
+from .context import pack_context
+from .rerank import Reranker
+from .metrics import stage_timer, timed_iter, count
 import time
+import numpy as np
+
+# Input limit of the embedding model; chunk budgets are capped to it
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+
+# Bump when the answer prompt changes so cached answers are not reused across prompts
+PROMPT_VERSION = "2"
+
+# Answer for questions the document does not cover (also what the prompt asks the model to say)
+NOT_FOUND_ANSWER = "The information is not available in the provided document"
+
+# Structured output for answering several questions in one call
+COMBINED_ANSWERS_SCHEMA = {
+    "name": "answers",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "answers": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "question": {"type": "integer", "description": "Question number"},
+                        "answer": {"type": "string"}
+                    },
+                    "required": ["question", "answer"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["answers"],
+        "additionalProperties": False
+    }
+}
+
+# Static prompt prefix: kept byte-identical across requests so upstream prompt caching applies
+SYSTEM_PROMPT = """You are a helpful AI assistant specializing in policy and legal document analysis.
+You answer questions based ONLY on the provided context from the document.
+
+Instructions:
+1. If the answer is clearly in the context, provide a detailed and accurate response
+2. If the answer is not in the context, state "The information is not available in the provided document"
+3. Be specific and cite relevant details from the context
+4. Do not make assumptions or add information not present in the context
+5. Maintain a professional and helpful tone"""
 
 class RAGSystem:
-    def __init__(self):
-        # Initialize OpenAI client with hackathon endpoint
-        self.client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url="https://agent.dev.hyperverge.org"
+    def __init__(self, client=None, vector_store: Optional[VectorStore] = None):
+        # Initialize OpenAI client with hackathon endpoint (a compatible client can be injected)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url="https://agent.dev.hyperverge.org",
+                max_retries=0  # retried by the upstream layer
+            )
+        self.client = client
+        
+        # All provider calls go through one rate-limited, retrying, circuit-broken layer
+        self.upstream = UpstreamClient(
+            client,
+            embeddings=self._upstream_endpoint("embedding", "EMBEDDING"),
+            chat=self._upstream_endpoint("chat", "CHAT")
         )
         
-        # Initialize Pinecone
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
         self.index_name = "hackathon-rag-index"
         self.embedding_model = "text-embedding-3-small"
         self.embedding_dimension = 1536
+        # Local embeddings used when the embeddings endpoint fails
+        self.fallback_embedder = HashedNgramEmbedder(self.embedding_dimension)
         
-        # Create or connect to index
-        self._setup_pinecone_index()
+        # Vector index backend: "pinecone" (default) or "local"
+        self.vector_store_backend = os.getenv("VECTOR_STORE", "pinecone").lower()
+        self.vector_store = vector_store or self._create_vector_store()
+        
+        # Token-budgeted chunking at sentence/paragraph/heading boundaries
+        self.chunker = TokenChunker(
+            max_tokens=min(int(os.getenv("CHUNK_MAX_TOKENS", "256")), EMBEDDING_MAX_INPUT_TOKENS),
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")),
+            tokenizer=get_tokenizer(self.embedding_model)
+        )
         
-        # Document cache to avoid reprocessing
-        self.processed_documents = {}
+        # Token budget for retrieved context in the answer prompt (merged passages, most relevant first)
+        self.context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+        
+        # Batching limits for embeddings.create requests
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+        
+        # Persistent embedding cache shared across documents and restarts (empty path disables it)
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        self.embedding_cache = None
+        if cache_path:
+            self.embedding_cache = EmbeddingCache(
+                cache_path,
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+                quantization=os.getenv("EMBEDDING_CACHE_QUANTIZATION", "none").lower()
+            )
+        
+        # Bounded worker pool shared by all requests for answering questions
+        self.question_concurrency = int(os.getenv("QUESTION_CONCURRENCY", "8"))
+        self.question_executor = ThreadPoolExecutor(
+            max_workers=max(1, self.question_concurrency),
+            thread_name_prefix="rag-question"
+        )
+        
+        # Multi-question requests: one embedding call and one batched search for all questions
+        # (BATCH_RETRIEVAL=false answers each question independently); with COMBINED_GENERATION_SIZE > 1,
+        # up to that many questions sharing retrieved chunks are answered in one JSON-structured call
+        self.batch_retrieval = os.getenv("BATCH_RETRIEVAL", "true").lower() == "true"
+        self.combined_generation_size = int(os.getenv("COMBINED_GENERATION_SIZE", "1"))
+        
+        # Workers that embed and upsert chunk batches while extraction continues
+        self.ingest_concurrency = int(os.getenv("INGEST_CONCURRENCY", "2"))
+        self.ingest_max_pending = max(1, self.ingest_concurrency) * 2
+        self.ingest_executor = ThreadPoolExecutor(
+            max_workers=max(1, self.ingest_concurrency),
+            thread_name_prefix="rag-ingest"
+        )
+        
+        # Multi-process PDF text extraction for long documents (pool is started on first use)
+        self.extract_workers = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+        self.extract_parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+        self._extract_executor = None
+        self._extract_lock = threading.Lock()
+        
+        # Per-document BM25 indexes fused with vector results (HYBRID_SEARCH=false disables), keyed by
+        # doc_id with the content hash they were built from; the least recently used beyond
+        # LEXICAL_INDEX_CACHE_SIZE are dropped and rebuilt from the chunk store when needed again
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+        self.lexical_indexes: "OrderedDict[str, Tuple[str, BM25Index]]" = OrderedDict()
+        self.lexical_index_cache_size = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "32"))
+        self._lexical_lock = threading.Lock()
+        self.lexical_flights = SingleFlight()
+        
+        # Local rescoring of over-fetched candidates to pick how many chunks to send (RERANK=false disables)
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "12"))
+        self.reranker = None
+        if os.getenv("RERANK", "true").lower() == "true":
+            self.reranker = Reranker(
+                keep_ratio=float(os.getenv("RERANK_KEEP_RATIO", "0.6")),
+                max_drop=float(os.getenv("RERANK_MAX_DROP", "0.25")),
+                decisive_margin=float(os.getenv("RERANK_DECISIVE_MARGIN", "0.3")),
+                min_similarity=float(os.getenv("RERANK_MIN_SIMILARITY", "0.15"))
+            )
+        
+        # Answer cache keyed on document content, question, retrieved chunks and prompt version
+        answer_cache_size = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+        self.answer_cache = None
+        if answer_cache_size > 0:
+            self.answer_cache = AnswerCache(
+                max_entries=answer_cache_size,
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+                similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+            )
+        
+        # In-flight ingests keyed by document id
+        self.ingest_flights = SingleFlight()
+        
+        # Pooled document downloads through an on-disk blob cache (empty path disables it)
+        self.fetcher = DocumentFetcher(
+            cache_dir=os.getenv("DOCUMENT_CACHE_DIR", ".cache/documents"),
+            max_bytes=int(os.getenv("DOCUMENT_MAX_BYTES", str(200 * 1024 * 1024))),
+            cache_max_bytes=int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+            timeout=float(os.getenv("DOCUMENT_FETCH_TIMEOUT", "30")),
+            retries=int(os.getenv("DOCUMENT_FETCH_RETRIES", "2"))
+        )
+        
+        # Indexed documents by doc_id: url, content hash and chunk manifest (chunk_id -> [index, start, end]),
+        # shared by all worker processes and kept across restarts (empty path keeps it in memory)
+        self.processed_documents = DocumentRegistry(
+            os.getenv("DOCUMENT_REGISTRY_PATH", ".cache/registry.sqlite3"),
+            lock_ttl=float(os.getenv("INGEST_LOCK_TTL", "600"))
+        )
+        
+        # Chunk text lives in local compressed files; vector metadata only carries ids
+        # (empty path keeps them in a temporary directory for this process)
+        self.chunk_store = ChunkStore(os.getenv("CHUNK_STORE_DIR", ".cache/chunks"))
+        
+        # A URL seen this recently is trusted without re-downloading to check its content hash
+        self.document_revalidate_seconds = float(os.getenv("DOCUMENT_REVALIDATE_SECONDS", "300"))
+        
+        # Chunks indexed with fallback vectors during an outage are re-embedded by a background job,
+        # after FALLBACK_REEMBED_DELAY seconds doubling per attempt, at most FALLBACK_REEMBED_ATTEMPTS times
+        self.fallback_reembed_delay = float(os.getenv("FALLBACK_REEMBED_DELAY", "60"))
+        self.fallback_reembed_attempts = int(os.getenv("FALLBACK_REEMBED_ATTEMPTS", "5"))
+        
+        # Background ingestion for pre-warming documents ahead of queries
+        self.ingest_queue = IngestQueue(
+            ingest=self._run_ingest_job,
+            document_id=create_document_id,
+            chunks_count=lambda doc_id: self.processed_documents.get(doc_id, {}).get('chunks_count'),
+            workers=int(os.getenv("INGEST_WORKERS", "2")),
+            max_queued=int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+        )
     
-    def _setup_pinecone_index(self):
-        """Setup Pinecone index"""
-        try:
-            # Check if index exists
-            existing_indexes = [index.name for index in self.pc.list_indexes()]
-            
-            if self.index_name not in existing_indexes:
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=self.embedding_dimension,
-                    metric='cosine',
-                    spec=ServerlessSpec(
-                        cloud='aws',
-                        region='us-east-1'
-                    )
-                )
-                # Wait for index to be ready
-                time.sleep(10)
-            
-            self.index = self.pc.Index(self.index_name)
-        except Exception as e:
-            print(f"Error setting up Pinecone: {e}")
-            raise
+    @staticmethod
+    def _upstream_endpoint(name: str, prefix: str) -> Endpoint:
+        """Limits for one provider endpoint: <prefix>_RPM / <prefix>_TPM (0 = unlimited) and
+        <prefix>_HEDGE_AFTER_MS (0 = no hedging), plus shared retry and circuit breaker settings"""
+        return Endpoint(
+            name,
+            requests_per_minute=float(os.getenv(f"{prefix}_RPM", "0")),
+            tokens_per_minute=float(os.getenv(f"{prefix}_TPM", "0")),
+            max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("UPSTREAM_BACKOFF_MAX", "20")),
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+            hedge_after=float(os.getenv(f"{prefix}_HEDGE_AFTER_MS", "0")) / 1000
+        )
     
-    def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text with fallback strategy"""
-        try:
-            # First try OpenAI embeddings
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
+    def _create_vector_store(self) -> VectorStore:
+        """Create the configured vector index backend"""
+        if self.vector_store_backend == "local":
+            # VECTOR_QUANTIZATION=int8|binary keeps only compact codes resident and rescores at full precision
+            rescore_factor = os.getenv("VECTOR_RESCORE_FACTOR")
+            return LocalVectorStore(
+                os.getenv("LOCAL_INDEX_DIR", ".cache/vectors"),
+                dimension=self.embedding_dimension,
+                quantization=os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+                rescore_factor=int(rescore_factor) if rescore_factor else None
             )
-            return response.data[0].embedding
-        except Exception as e:
-            print(f"Error getting embedding: {e}")
-            # Fallback: Use LLM to generate semantic hash
-            return self._generate_semantic_embedding(text)
+        if self.vector_store_backend == "pinecone":
+            return PineconeVectorStore(
+                api_key=os.getenv("PINECONE_API_KEY"),
+                index_name=self.index_name,
+                dimension=self.embedding_dimension,
+                ready_timeout=float(os.getenv("PINECONE_READY_TIMEOUT", "120"))
+            )
+        raise ValueError(f"Unknown VECTOR_STORE backend: {self.vector_store_backend}")
     
-    def _generate_semantic_embedding(self, text: str) -> List[float]:
-        """Generate semantic embedding using LLM analysis as fallback"""
+    def get_embedding(self, text: str) -> np.ndarray:
+        """Get a float32 embedding for text with fallback strategy"""
+        if self.embedding_cache:
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            count("embedding_cache_hit" if cached is not None else "embedding_cache_miss")
+            if cached is not None:
+                return cached
+        
         try:
-            # Use the LLM to extract key semantic features
-            response = self.client.chat.completions.create(
-                model="openai/gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Extract 10 key semantic concepts from the text. Return only comma-separated single words representing the main concepts, topics, and entities."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"Text: {text[:500]}..."  # Limit text length
-                    }
-                ],
-                max_tokens=50
-            )
-            
-            concepts = response.choices[0].message.content.strip().split(',')
-            concepts = [c.strip().lower() for c in concepts if c.strip()]
-            
-            # Convert concepts to numerical embedding (1536 dimensions)
-            import hashlib
-            import struct
-            
-            # Create a 1536-dimensional vector
-            embedding = [0.0] * 1536
-            
-            # Use concept hashes to populate the embedding
-            for i, concept in enumerate(concepts[:10]):  # Use first 10 concepts
-                hash_obj = hashlib.md5(concept.encode())
-                hash_bytes = hash_obj.digest()
-                
-                # Convert hash to multiple float values
-                for j in range(0, len(hash_bytes), 4):
-                    if j + 4 <= len(hash_bytes):
-                        chunk = hash_bytes[j:j+4]
-                        if len(chunk) == 4:
-                            value = struct.unpack('>f', chunk)[0] if len(chunk) == 4 else 0.0
-                            # Normalize to [-1, 1] range
-                            value = max(-1.0, min(1.0, value / 1e6))
-                            pos = (i * 153 + (j // 4)) % 1536
-                            embedding[pos] = value
-            
-            # Add text length and character distribution features
-            text_features = [
-                len(text) / 1000.0,  # Normalized length
-                text.count(' ') / len(text) if text else 0,  # Word density
-                sum(1 for c in text if c.isupper()) / len(text) if text else 0,  # Uppercase ratio
-                sum(1 for c in text if c.isdigit()) / len(text) if text else 0,  # Digit ratio
-            ]
-            
-            # Incorporate text features
-            for i, feature in enumerate(text_features):
-                if i < len(embedding):
-                    embedding[i] = (embedding[i] + feature) / 2
-            
+            # First try OpenAI embeddings
+            with stage_timer("embed"):
+                response = self.upstream.create_embeddings(
+                    estimate_tokens(text),
+                    model=self.embedding_model,
+                    input=text
+                )
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+            if self.embedding_cache:
+                self.embedding_cache.put(self.embedding_model, text, embedding)
             return embedding
-            
         except Exception as e:
-            print(f"Error generating semantic embedding: {e}")
-            # Ultimate fallback: simple hash-based embedding
-            return self._simple_hash_embedding(text)
-    
-    def _simple_hash_embedding(self, text: str) -> List[float]:
-        """Simple hash-based embedding as ultimate fallback"""
-        import hashlib
-        import struct
-        
-        # Create hash of text
-        hash_obj = hashlib.sha256(text.encode())
-        hash_bytes = hash_obj.digest()
-        
-        # Convert to 1536-dimensional vector
-        embedding = []
-        for i in range(0, min(len(hash_bytes), 1536 * 4), 4):
-            chunk = hash_bytes[i:i+4]
-            if len(chunk) == 4:
-                value = struct.unpack('>I', chunk)[0] / 4294967295.0  # Normalize to [0,1]
-                embedding.append(value * 2 - 1)  # Convert to [-1,1]
+            print(f"Error getting embedding: {e}")
+            count("embedding_fallback")
+            # Fallback: local hashed n-gram embedding
+            return self.fallback_embedder.embed([text])[0]
+    
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Get a float32 (len(texts), dimension) matrix of embeddings, serving repeats from the cache"""
+        return self._embed(texts)[0]
+    
+    def _embed(self, texts: List[str]) -> Tuple[np.ndarray, List[bool]]:
+        """Embeddings plus, per text, whether it holds a fallback vector because the provider was
+        unavailable (worth requesting again later); inputs the provider rejected are not retried"""
+        embeddings = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        deferred = [False] * len(texts)
+        cached: List[Optional[np.ndarray]] = [None] * len(texts)
+        if self.embedding_cache:
+            cached = self.embedding_cache.get_many(self.embedding_model, texts)
+            hits = sum(1 for embedding in cached if embedding is not None)
+            count("embedding_cache_hit", hits)
+            count("embedding_cache_miss", len(texts) - hits)
+        
+        # Request each distinct missing text once
+        missing: Dict[str, List[int]] = {}
+        for i, (text, embedding) in enumerate(zip(texts, cached)):
+            if embedding is None:
+                missing.setdefault(text, []).append(i)
             else:
-                embedding.append(0.0)
+                embeddings[i] = embedding
         
-        # Pad to 1536 dimensions
-        while len(embedding) < 1536:
-            embedding.append(0.0)
+        if missing:
+            missing_texts = list(missing)
+            computed, fresh, unavailable = self._request_embeddings(missing_texts)
+            for text, embedding, retry in zip(missing_texts, computed, unavailable):
+                embeddings[missing[text]] = embedding
+                if retry:
+                    for i in missing[text]:
+                        deferred[i] = True
             
-        return embedding[:1536]
+            # Only cache real model output, never fallback vectors
+            if self.embedding_cache:
+                self.embedding_cache.put_many(
+                    self.embedding_model,
+                    [text for text, ok in zip(missing_texts, fresh) if ok],
+                    [embedding for embedding, ok in zip(computed, fresh) if ok]
+                )
+        
+        return embeddings, deferred
+    
+    def _request_embeddings(self, texts: List[str]) -> Tuple[np.ndarray, List[bool], List[bool]]:
+        """Embed texts with batched requests; returns a float32 matrix, which rows came from the model
+        and which fell back because the provider was unavailable (open circuit or transient errors)"""
+        embeddings = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        fresh = [False] * len(texts)
+        unavailable = [False] * len(texts)
+        
+        # Batches of positions still to request; rejected batches are split and retried
+        pending = list(batch_for_embedding(texts, self.embedding_batch_size, self.embedding_batch_tokens))
+        
+        while pending:
+            positions = pending.pop()
+            try:
+                with stage_timer("embed"):
+                    response = self.upstream.create_embeddings(
+                        sum(estimate_tokens(texts[i]) for i in positions),
+                        model=self.embedding_model,
+                        input=[texts[i] for i in positions]
+                    )
+                data = sorted(response.data, key=lambda item: item.index)
+                if len(data) != len(positions):
+                    raise ValueError(f"Expected {len(positions)} embeddings, got {len(data)}")
+                for position, item in zip(positions, data):
+                    embeddings[position] = item.embedding
+                    fresh[position] = True
+            except Exception as e:
+                print(f"Error getting embeddings for batch of {len(positions)}: {e}")
+                if isinstance(e, CircuitOpen):
+                    # Provider is down: embed everything still pending locally without more calls
+                    positions = positions + [position for batch in pending for position in batch]
+                    pending = []
+                elif len(positions) > 1 and not retryable(e):
+                    # Rejected request (transient errors were already retried): bisect down to
+                    # single inputs, so only the bad ones fall back (about log2(batch) levels)
+                    count("embedding_batch_retry")
+                    middle = len(positions) // 2
+                    pending.append(positions[middle:])
+                    pending.append(positions[:middle])
+                else:
+                    count("embedding_fallback", len(positions))
+                    embeddings[positions] = self.fallback_embedder.embed([texts[i] for i in positions])
+                    if isinstance(e, CircuitOpen) or retryable(e):
+                        for position in positions:
+                            unavailable[position] = True
+        
+        return embeddings, fresh, unavailable
     
     def process_document(self, document_url: str) -> bool:
         """Process and index a document"""
         doc_id = create_document_id(document_url)
+        if not self._ensure_indexed(document_url, doc_id):
+            return False
         
+        # Fallback vectors left by an outage are replaced in the background, not on the request path
+        if self._reembed_due(self.processed_documents.get(doc_id)):
+            try:
+                self.ingest_queue.submit(document_url)
+            except IngestQueueFull:
+                pass
+        return True
+    
+    def _run_ingest_job(self, document_url: str) -> bool:
+        """Ingest queue entry point: index the document, then re-embed its fallback chunks if due"""
+        doc_id = create_document_id(document_url)
+        if not self._ensure_indexed(document_url, doc_id):
+            return False
+        if self._reembed_due(self.processed_documents.get(doc_id)):
+            self.ingest_flights.do(doc_id, self._reembed_fallback_chunks, doc_id)
+        return True
+    
+    def _ensure_indexed(self, document_url: str, doc_id: str) -> bool:
+        """Index the document unless it was indexed or revalidated recently"""
         # Check if already processed
-        if doc_id in self.processed_documents:
+        if self._is_fresh(doc_id, document_url):
             print(f"Document {doc_id} already processed, skipping...")
+            count("document_cache_hit")
             return True
         
+        # Concurrent requests for the same document wait on the first ingest, download included
+        with stage_timer("ingest"):
+            return self.ingest_flights.do(doc_id, self._ingest_document, document_url, doc_id)
+    
+    def _is_fresh(self, doc_id: str, document_url: str) -> bool:
+        """Whether this exact URL was indexed or revalidated recently enough to skip downloading"""
+        record = self.processed_documents.get(doc_id)
+        return bool(record) and record['url'] == document_url and \
+            time.time() - record['checked_at'] < self.document_revalidate_seconds
+    
+    def _reembed_due(self, record: Optional[Dict[str, Any]]) -> bool:
+        """Whether a record has fallback chunks whose next re-embedding attempt is due"""
+        return bool(record) and bool(record.get('fallback_chunks')) and \
+            record.get('reembed_attempts', 0) < self.fallback_reembed_attempts and \
+            time.time() >= record.get('reembed_after', 0) and \
+            self.upstream.embeddings.breaker.state != "open"
+    
+    def _reembed_fallback_chunks(self, doc_id: str) -> bool:
+        """Embed the chunks that were indexed with fallback vectors again, reading their text locally"""
+        with self.processed_documents.ingest_lock(doc_id):
+            # Another process may have re-embedded or re-indexed the document first
+            record = self.processed_documents.get(doc_id)
+            if not self._reembed_due(record):
+                return True
+            
+            chunks = record['chunks']
+            chunk_ids = [chunk_id for chunk_id in record['fallback_chunks'] if chunk_id in chunks]
+            texts = self.chunk_store.get(doc_id, record['content_hash'], [chunks[chunk_id][0] for chunk_id in chunk_ids])
+            batch = [
+                (chunk_id, chunks[chunk_id][0], text, False)
+                for chunk_id, text in zip(chunk_ids, texts) if text is not None
+            ]
+            remaining = [chunk_id for chunk_id, text in zip(chunk_ids, texts) if text is None]
+            for start in range(0, len(batch), self.embedding_batch_size):
+                remaining.extend(self._index_batch(doc_id, batch[start:start + self.embedding_batch_size]))
+            with stage_timer("upsert"):
+                self.vector_store.flush()
+            
+            attempts = record.get('reembed_attempts', 0) + 1
+            self.processed_documents[doc_id] = {
+                **record,
+                'fallback_chunks': remaining,
+                'reembed_attempts': attempts,
+                'reembed_after': time.time() + self.fallback_reembed_delay * 2 ** attempts
+            }
+            count("chunks_reembedded", len(chunk_ids) - len(remaining))
+            print(f"Re-embedded {len(chunk_ids) - len(remaining)} fallback chunks of {doc_id}, {len(remaining)} left")
+            return True
+    
+    def _ingest_document(self, document_url: str, doc_id: str) -> bool:
+        """Ingest under the registry lock, so one process at a time works on a document"""
+        with self.processed_documents.ingest_lock(doc_id):
+            return self._index_document(document_url, doc_id)
+    
+    def _index_document(self, document_url: str, doc_id: str) -> bool:
+        """Download a document and re-index whatever changed (one caller per doc_id at a time)"""
+        # Another ingest (here or in another process) may have finished before we got the lock
+        if self._is_fresh(doc_id, document_url):
+            return True
+        
+        document = None
         try:
-            # Download and extract text
+            # Download through the blob cache (a conditional request when a copy is cached)
             print("Downloading document...")
-            pdf_bytes = download_pdf(document_url)
-            if not pdf_bytes:
+            with stage_timer("download"):
+                document = self.fetcher.fetch(document_url)
+            if document is None:
                 return False
+            content_hash = document.content_hash
             
-            print("Extracting text...")
-            text = extract_text_from_pdf(pdf_bytes)
-            if not text:
-                return False
-            
-            text = clean_text(text)
-            
-            # Create chunks
-            print("Creating chunks...")
-            chunks = chunk_text(text, chunk_size=1000, overlap=200)
-            print(f"Created {len(chunks)} chunks")
+            # Same bytes as already indexed (e.g. a re-signed URL): nothing to do
+            record = self.processed_documents.get(doc_id)
+            if record and record['content_hash'] == content_hash:
+                print(f"Document {doc_id} unchanged, skipping re-indexing...")
+                count("document_unchanged")
+                self.processed_documents[doc_id] = {**record, 'url': document_url, 'checked_at': time.time()}
+                return True
             
-            # Generate embeddings and index
-            print("Generating embeddings and indexing...")
-            vectors_to_upsert = []
-            
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{doc_id}_chunk_{i}"
-                embedding = self.get_embedding(chunk)
-                
-                if embedding:
-                    vectors_to_upsert.append({
-                        'id': chunk_id,
-                        'values': embedding,
-                        'metadata': {
-                            'text': chunk,
-                            'doc_id': doc_id,
-                            'chunk_index': i,
-                            'document_url': document_url
-                        }
-                    })
+            # Extract, clean and chunk page by page; embedding and upserts overlap with extraction
+            print("Extracting, chunking and indexing...")
+            existing = record['chunks'] if record else {}
+            # Chunks indexed with fallback vectors are embedded again rather than kept or reused
+            retry = set(record.get('fallback_chunks', ())) if record else set()
+            reusable = {chunk_id: position for chunk_id, position in existing.items() if chunk_id not in retry}
+            pages = timed_iter(self._iter_pages(document.path), "extract")
+            chunks = timed_iter(self.chunker.iter_chunks(pages), "chunk")
+            manifest, fallback_chunks = self._index_chunks(doc_id, content_hash, chunks, reusable)
+            if not manifest:
+                return False
             
-            # Upsert in batches
-            batch_size = 100
-            for i in range(0, len(vectors_to_upsert), batch_size):
-                batch = vectors_to_upsert[i:i + batch_size]
-                self.index.upsert(vectors=batch)
+            # Drop chunks that no longer exist in the new version
+            stale = [chunk_id for chunk_id in existing if chunk_id not in manifest]
+            if stale:
+                with stage_timer("upsert"):
+                    self.vector_store.delete(stale, doc_id=doc_id)
+                    self.vector_store.flush()
+                count("chunks_deleted", len(stale))
             
             # Mark as processed
+            now = time.time()
             self.processed_documents[doc_id] = {
                 'url': document_url,
-                'chunks_count': len(chunks),
-                'processed_at': time.time()
+                'chunks_count': len(manifest),
+                'content_hash': content_hash,
+                'chunks': manifest,
+                'fallback_chunks': fallback_chunks,
+                'reembed_attempts': 0,
+                'reembed_after': now + self.fallback_reembed_delay,
+                'processed_at': now,
+                'checked_at': now
             }
             
-            print(f"Successfully indexed {len(chunks)} chunks for document {doc_id}")
+            self.chunk_store.remove_versions(doc_id, keep=content_hash)
+            
+            if fallback_chunks:
+                print(f"{len(fallback_chunks)} chunks of {doc_id} use fallback embeddings and will be re-embedded in the background")
+            print(f"Successfully indexed {len(manifest)} chunks for document {doc_id} ({len(stale)} removed)")
             return True
             
         except Exception as e:
             print(f"Error processing document: {e}")
             return False
+        finally:
+            if document:
+                self.fetcher.release(document)
+    
+    def _iter_pages(self, pdf_path: str) -> Iterable[str]:
+        """Yield page text, fanning out to worker processes for long documents"""
+        if self.extract_workers > 1:
+            page_count = count_pdf_pages(pdf_path)
+            if page_count >= self.extract_parallel_min_pages:
+                print(f"Extracting {page_count} pages with {self.extract_workers} processes...")
+                executor = self._get_extract_executor()
+                extracted = 0
+                try:
+                    for page in iter_pdf_pages_parallel(pdf_path, page_count, executor, self.extract_workers):
+                        yield page
+                        extracted += 1
+                    return
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. killed for memory): finish this document in-process and
+                    # let the next long document start a fresh pool
+                    print(f"PDF extraction pool failed after {extracted} pages, continuing in-process: {e}")
+                    count("pdf_extract_pool_broken")
+                    self._discard_extract_executor(executor)
+                yield from itertools.islice(iter_pdf_pages(pdf_path), extracted, None)
+                return
+        yield from iter_pdf_pages(pdf_path)
+    
+    def _get_extract_executor(self) -> ProcessPoolExecutor:
+        """Lazily start the extraction process pool"""
+        with self._extract_lock:
+            if self._extract_executor is None:
+                # spawn avoids forking a process that already runs request threads
+                self._extract_executor = ProcessPoolExecutor(
+                    max_workers=self.extract_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._extract_executor
+    
+    def _discard_extract_executor(self, executor: ProcessPoolExecutor):
+        """Drop a broken extraction pool so _get_extract_executor starts a new one"""
+        with self._extract_lock:
+            if self._extract_executor is executor:
+                self._extract_executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    def close(self):
+        """Stop background workers and release pooled connections"""
+        self.ingest_queue.close()
+        self.question_executor.shutdown(wait=False, cancel_futures=True)
+        self.ingest_executor.shutdown(wait=False, cancel_futures=True)
+        with self._extract_lock:
+            if self._extract_executor is not None:
+                self._extract_executor.shutdown(wait=False, cancel_futures=True)
+                self._extract_executor = None
+        self.fetcher.close()
+        self.upstream.close()
+        self.vector_store.flush()
+    
+    def _index_chunks(self, doc_id: str, content_hash: str, chunks: Iterable[Tuple[ChunkSpan, str]],
+                      existing: Dict[str, List[int]]) -> Tuple[Dict[str, List[int]], List[str]]:
+        """Embed and upsert new or moved chunks in batches while more chunks are being produced
+        
+        Chunk ids are derived from chunk text: chunks already in the index at
+        the same position are skipped, and chunks that only moved reuse their
+        stored vectors. Every chunk's text is written to the chunk store.
+        Returns the new chunk manifest and the ids of chunks that were
+        indexed with fallback embeddings while the provider was unavailable.
+        """
+        in_flight = deque()
+        batch = []
+        manifest: Dict[str, List[int]] = {}
+        fallback_chunks: List[str] = []
+        unchanged = 0
+        lexical_index = BM25Index() if self.hybrid_search else None
+        writer = self.chunk_store.writer(doc_id, content_hash)
+        
+        try:
+            for index, (span, chunk) in enumerate(chunks):
+                chunk_id = f"{doc_id}_{hash_chunk(chunk)}"
+                if chunk_id in manifest:
+                    # Repeated text within the document
+                    chunk_id = f"{chunk_id}_{index}"
+                position = [index, span.start, span.end]
+                manifest[chunk_id] = position
+                writer.append(chunk)
+                if lexical_index is not None:
+                    lexical_index.add(chunk_id, chunk)
+                
+                if existing.get(chunk_id) == position:
+                    unchanged += 1
+                    continue
+                batch.append((chunk_id, index, chunk, chunk_id in existing))
+                if len(batch) >= self.embedding_batch_size:
+                    in_flight.append(self._submit(self.ingest_executor, self._index_batch, doc_id, batch))
+                    batch = []
+                    # Bound buffered work so memory stays flat on very large documents
+                    while len(in_flight) > self.ingest_max_pending:
+                        fallback_chunks.extend(in_flight.popleft().result())
+            
+            if batch:
+                in_flight.append(self._submit(self.ingest_executor, self._index_batch, doc_id, batch))
+            
+            while in_flight:
+                fallback_chunks.extend(in_flight.popleft().result())
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            for future in in_flight:
+                future.cancel()
+        
+        with stage_timer("upsert"):
+            self.vector_store.flush()
+        count("chunks_unchanged", unchanged)
+        count("chunks_indexed", len(manifest) - unchanged)
+        count("chunks_fallback_embedded", len(fallback_chunks))
+        
+        if lexical_index is not None:
+            lexical_index.freeze()
+            self._remember_lexical_index(doc_id, content_hash, lexical_index)
+        
+        return manifest, fallback_chunks
     
-    def query_document(self, question: str, top_k: int = 5) -> QueryResult:
-        """Query the indexed document"""
+    def _index_batch(self, doc_id: str, batch: List[Tuple[str, int, str, bool]]) -> List[str]:
+        """Upsert one batch of (chunk_id, chunk_index, text, moved) entries
+        
+        Moved chunks keep their stored vector and only get new metadata; the
+        rest are embedded. Metadata holds ids only: text, offsets and the
+        document URL are looked up locally after a search. Returns the ids
+        that got fallback embeddings while the provider was unavailable.
+        """
+        moved_ids = [chunk_id for chunk_id, _, _, moved in batch if moved]
+        values = self.vector_store.fetch(moved_ids, doc_id=doc_id) if moved_ids else {}
+        to_embed = [chunk for chunk_id, _, chunk, _ in batch if chunk_id not in values]
+        embedded, deferred = self._embed(to_embed) if to_embed else ((), [])
+        embedded, deferred = iter(embedded), iter(deferred)
+        count("chunks_moved", len(values))
+        vectors_to_upsert = []
+        fallback_ids = []
+        
+        for chunk_id, i, chunk, _ in batch:
+            if chunk_id in values:
+                embedding = values[chunk_id]
+            else:
+                embedding = next(embedded)
+                if next(deferred):
+                    fallback_ids.append(chunk_id)
+            if embedding is not None and embedding.size:
+                vectors_to_upsert.append({
+                    'id': chunk_id,
+                    'values': embedding,
+                    'metadata': {
+                        'doc_id': doc_id,
+                        'chunk_index': i
+                    }
+                })
+        
+        with stage_timer("upsert"):
+            self.vector_store.upsert(vectors_to_upsert)
+        return fallback_ids
+    
+    def query_document(self, question: str, top_k: int = 5, doc_id: Optional[str] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> QueryResult:
+        """Query the indexed document, restricted to doc_id when given
+        
+        on_token, if given, receives answer tokens as they are generated
+        (answers served from the cache are not streamed).
+        """
         try:
             # Get embedding for question
             question_embedding = self.get_embedding(question)
-            if not question_embedding:
+            if question_embedding is None or not question_embedding.size:
                 return QueryResult(
                     answer="Error: Could not process question",
                     confidence=0.0,
                     source_chunks=[]
                 )
             
-            # Search in Pinecone
-            search_results = self.index.query(
-                vector=question_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
+            # Reuse an answer to a near-identical question about the same document content
+            cache_scope = self._answer_cache_scope(doc_id)
+            cached = self._find_similar_answer(cache_scope, question_embedding)
+            if cached is not None:
+                return cached
             
-            if not search_results.matches:
-                return QueryResult(
-                    answer="No relevant information found in the document.",
-                    confidence=0.0,
-                    source_chunks=[]
+            # Search the vector index, over-fetching when results will be fused or reranked
+            with stage_timer("vector_query"):
+                matches = self.vector_store.query(
+                    vector=question_embedding,
+                    top_k=self._search_top_k(top_k, doc_id),
+                    doc_id=doc_id
                 )
+            matches = self._hydrate([matches])[0]
             
-            # Extract context from search results
-            context_chunks = []
-            source_chunks = []
+            matches, result = self._select_matches(question, matches, top_k, doc_id)
+            if result is not None:
+                return result
             
-            for match in search_results.matches:
-                if match.metadata and 'text' in match.metadata:
-                    context_chunks.append(match.metadata['text'])
-                    source_chunks.append(f"Relevance: {match.score:.3f} - {match.metadata['text'][:200]}...")
+            return self._generate_result(question, question_embedding, matches, cache_scope, on_token)
             
-            # Generate answer using GPT-4
-            answer = self._generate_answer(question, context_chunks)
+        except Exception as e:
+            print(f"Error querying document: {e}")
+            return QueryResult(
+                answer=f"Error processing query: {str(e)}",
+                confidence=0.0,
+                source_chunks=[]
+            )
+    
+    def query_documents(self, questions: List[str], top_k: int = 5, doc_id: Optional[str] = None) -> List[QueryResult]:
+        """Answer a batch of questions with shared retrieval
+        
+        All questions are embedded in one request and searched together;
+        matches for the same chunk share one metadata record. Answers are
+        then generated per question on the question pool or, with
+        combined generation, for groups of questions sharing retrieved
+        chunks in one structured call. Results are in input order.
+        """
+        results: List[Optional[QueryResult]] = [None] * len(questions)
+        cache_scope = self._answer_cache_scope(doc_id)
+        
+        try:
+            embeddings = self.get_embeddings(questions)
+        except Exception as e:
+            # Answer each question on its own so one failure cannot fail them all
+            print(f"Error embedding questions, answering them one by one: {e}")
+            count("batch_retrieval_fallback")
+            def answer(index: int):
+                results[index] = self.query_document(questions[index], top_k=top_k, doc_id=doc_id)
+            self._run_all([(answer, index) for index in range(len(questions))])
+            return results
+        
+        pending = []
+        for index, embedding in enumerate(embeddings):
+            cached = self._find_similar_answer(cache_scope, embedding)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+        
+        if pending:
+            search_top_k = self._search_top_k(top_k, doc_id)
+            try:
+                with stage_timer("vector_query"):
+                    match_lists = self.vector_store.query_many(
+                        [embeddings[index] for index in pending],
+                        top_k=search_top_k,
+                        doc_id=doc_id
+                    )
+                    match_lists = self._hydrate(match_lists)
+            except Exception as e:
+                # Retry the searches one by one; only the questions that still fail get an error
+                print(f"Error in batched vector query, querying one by one: {e}")
+                count("batch_retrieval_fallback")
+                match_lists = [self._retrieve_one(embeddings[index], search_top_k, doc_id) for index in pending]
+            count("batch_chunks_retrieved", sum(len(matches) for matches in match_lists if isinstance(matches, list)))
+            count("batch_chunks_distinct", len({match.id for matches in match_lists if isinstance(matches, list) for match in matches}))
             
-            # Calculate confidence based on top match score
-            confidence = search_results.matches[0].score if search_results.matches else 0.0
+            selected: Dict[int, List[VectorMatch]] = {}
+            for index, matches in zip(pending, match_lists):
+                if isinstance(matches, QueryResult):
+                    results[index] = matches
+                    continue
+                try:
+                    matches, result = self._select_matches(questions[index], matches, top_k, doc_id)
+                except Exception as e:
+                    print(f"Error querying document: {e}")
+                    matches, result = [], self._error_result(e)
+                if result is not None:
+                    results[index] = result
+                else:
+                    selected[index] = matches
             
-            return QueryResult(
-                answer=answer,
-                confidence=confidence,
-                source_chunks=source_chunks
+            if self.combined_generation_size > 1:
+                groups = self._group_questions(selected)
+                self._run_all([
+                    (self._generate_group, [(index, questions[index], embeddings[index], selected[index]) for index in group],
+                     cache_scope, results)
+                    for group in groups
+                ])
+            else:
+                def generate(index: int):
+                    results[index] = self._generate_result(questions[index], embeddings[index], selected[index], cache_scope)
+                self._run_all([(generate, index) for index in selected])
+        
+        return results
+    
+    def _retrieve_one(self, question_embedding: np.ndarray, top_k: int,
+                      doc_id: Optional[str]) -> Union[List[VectorMatch], QueryResult]:
+        """Search and hydrate for one question; a failure becomes that question's error result"""
+        try:
+            with stage_timer("vector_query"):
+                matches = self.vector_store.query(vector=question_embedding, top_k=top_k, doc_id=doc_id)
+            return self._hydrate([matches])[0]
+        except Exception as e:
+            print(f"Error querying document: {e}")
+            return self._error_result(e)
+    
+    @staticmethod
+    def _error_result(error: Exception) -> QueryResult:
+        return QueryResult(
+            answer=f"Error processing query: {str(error)}",
+            confidence=0.0,
+            source_chunks=[]
+        )
+    
+    def _run_all(self, calls: List[tuple]):
+        """Run (fn, *args) calls on the question pool and wait for them all"""
+        if self.question_concurrency <= 1 or len(calls) <= 1:
+            for fn, *args in calls:
+                fn(*args)
+            return
+        futures = [self._submit(self.question_executor, fn, *args) for fn, *args in calls]
+        for future in futures:
+            future.result()
+    
+    def _find_similar_answer(self, cache_scope: Optional[Tuple[str, str]], question_embedding: np.ndarray) -> Optional[QueryResult]:
+        if not cache_scope:
+            return None
+        cached = self.answer_cache.find_similar(cache_scope, question_embedding)
+        if cached is not None:
+            count("answer_cache_similar_hit")
+        return cached
+    
+    def _search_top_k(self, top_k: int, doc_id: Optional[str]) -> int:
+        """Vector matches to request: over-fetch when results will be reranked or fused"""
+        candidates = max(top_k, self.rerank_candidates) if self.reranker else top_k
+        lexical_index = self._lexical_index(doc_id)
+        return candidates * 2 if lexical_index else candidates
+    
+    def _hydrate(self, match_lists: List[List[VectorMatch]]) -> List[List[VectorMatch]]:
+        """Attach chunk text and offsets from the chunk store to search results
+        
+        Each distinct chunk is read once across all lists. Matches whose text
+        cannot be found (e.g. chunks of a version still being indexed) are
+        dropped; metadata that already carries text is kept as is.
+        """
+        wanted: Dict[str, Dict[str, Tuple[int, int, int]]] = {}
+        records = {}
+        for matches in match_lists:
+            for match in matches:
+                metadata = match.metadata or {}
+                doc_id = metadata.get('doc_id')
+                if 'text' in metadata or not doc_id:
+                    continue
+                if doc_id not in records:
+                    records[doc_id] = self.processed_documents.get(doc_id)
+                record = records[doc_id]
+                position = record['chunks'].get(match.id) if record else None
+                if position is not None:
+                    wanted.setdefault(doc_id, {})[match.id] = tuple(position)
+        
+        hydrated: Dict[str, Dict[str, Any]] = {}
+        for doc_id, positions in wanted.items():
+            chunk_ids = list(positions)
+            texts = self.chunk_store.get(doc_id, records[doc_id]['content_hash'], [positions[c][0] for c in chunk_ids])
+            for chunk_id, text in zip(chunk_ids, texts):
+                if text is not None:
+                    index, start, end = positions[chunk_id]
+                    hydrated[chunk_id] = {'text': text, 'doc_id': doc_id, 'chunk_index': index, 'start': start, 'end': end}
+        
+        results = []
+        missing = 0
+        for matches in match_lists:
+            kept = []
+            for match in matches:
+                if 'text' in (match.metadata or {}):
+                    kept.append(match)
+                elif match.id in hydrated:
+                    kept.append(VectorMatch(id=match.id, score=match.score, metadata=hydrated[match.id]))
+                else:
+                    missing += 1
+            results.append(kept)
+        count("chunk_text_missing", missing)
+        return results
+    
+    def _lexical_index(self, doc_id: Optional[str]) -> Optional[BM25Index]:
+        """BM25 index for the indexed version of a document, rebuilt from the chunk store when this
+        process has none (another worker ingested it, or after a restart)"""
+        if not doc_id or not self.hybrid_search:
+            return None
+        record = self.processed_documents.get(doc_id)
+        if not record:
+            return None
+        content_hash = record['content_hash']
+        with self._lexical_lock:
+            cached = self.lexical_indexes.get(doc_id)
+            if cached is not None and cached[0] == content_hash:
+                self.lexical_indexes.move_to_end(doc_id)
+                return cached[1]
+        return self.lexical_flights.do(f"{doc_id}:{content_hash}", self._build_lexical_index, doc_id, record)
+    
+    def _build_lexical_index(self, doc_id: str, record: Dict[str, Any]) -> Optional[BM25Index]:
+        chunk_ids = sorted(record['chunks'], key=lambda chunk_id: record['chunks'][chunk_id][0])
+        lexical_index = BM25Index()
+        with stage_timer("lexical_build"):
+            for chunk_id, text in zip(chunk_ids, self.chunk_store.iter_texts(doc_id, record['content_hash'])):
+                lexical_index.add(chunk_id, text)
+            lexical_index.freeze()
+        if len(lexical_index) != len(chunk_ids):
+            return None
+        self._remember_lexical_index(doc_id, record['content_hash'], lexical_index)
+        return lexical_index
+    
+    def _remember_lexical_index(self, doc_id: str, content_hash: str, lexical_index: BM25Index):
+        with self._lexical_lock:
+            self.lexical_indexes[doc_id] = (content_hash, lexical_index)
+            self.lexical_indexes.move_to_end(doc_id)
+            while len(self.lexical_indexes) > self.lexical_index_cache_size:
+                self.lexical_indexes.popitem(last=False)
+    
+    def _select_matches(self, question: str, matches: List[VectorMatch], top_k: int,
+                        doc_id: Optional[str]) -> Tuple[List[VectorMatch], Optional[QueryResult]]:
+        """Fuse and rerank vector matches into the context to answer from
+        
+        Returns the chosen matches, or a final result when there is nothing
+        to send to the model.
+        """
+        candidates = max(top_k, self.rerank_candidates) if self.reranker else top_k
+        lexical_index = self._lexical_index(doc_id)
+        if lexical_index:
+            with stage_timer("lexical_search"):
+                matches = self._fuse_lexical(question, matches, lexical_index, doc_id, candidates)
+        
+        if not matches:
+            return [], QueryResult(
+                answer="No relevant information found in the document.",
+                confidence=0.0,
+                source_chunks=[]
             )
+        
+        # Keep as many of the best candidates as their scores justify (up to top_k)
+        if self.reranker:
+            with stage_timer("rerank"):
+                reranked = self.reranker.rerank(question, matches, max_chunks=top_k)
+            if not reranked.found:
+                count("rerank_not_found")
+                return [], QueryResult(
+                    answer=NOT_FOUND_ANSWER,
+                    confidence=max(match.score for match in matches),
+                    source_chunks=[]
+                )
+            count("rerank_chunks_kept", len(reranked.matches))
+            return reranked.matches, None
+        
+        return matches[:top_k], None
+    
+    @staticmethod
+    def _source_chunks(matches: List[VectorMatch]) -> List[str]:
+        return [
+            f"Relevance: {match.score:.3f} - {match.metadata['text'][:200]}..."
+            for match in matches if match.metadata and 'text' in match.metadata
+        ]
+    
+    def _cached_answer(self, cache_scope: Optional[Tuple[str, str]], question: str,
+                       matches: List[VectorMatch]) -> Tuple[Optional[str], Optional[QueryResult]]:
+        """Same question over the same retrieved chunks gives the same answer: (cache key, cached result)"""
+        if not cache_scope:
+            return None, None
+        cache_key = AnswerCache.make_key(cache_scope[0], question, [match.id for match in matches], cache_scope[1])
+        cached = self.answer_cache.get(cache_key)
+        count("answer_cache_hit" if cached is not None else "answer_cache_miss")
+        return cache_key, cached
+    
+    def _store_answer(self, cache_key: Optional[str], cache_scope: Optional[Tuple[str, str]], question_embedding: np.ndarray,
+                      matches: List[VectorMatch], answer: str) -> QueryResult:
+        """Build the result for a generated answer and cache it"""
+        result = QueryResult(
+            answer=answer,
+            # Confidence based on the best vector similarity
+            confidence=max(match.score for match in matches) if matches else 0.0,
+            source_chunks=self._source_chunks(matches)
+        )
+        if cache_key and not answer.startswith("Error generating answer"):
+            self.answer_cache.put(cache_key, result, cache_scope, question_embedding)
+        return result
+    
+    def _generate_result(self, question: str, question_embedding: np.ndarray, matches: List[VectorMatch],
+                         cache_scope: Optional[Tuple[str, str]],
+                         on_token: Optional[Callable[[str], None]] = None) -> QueryResult:
+        """Answer one question from its selected matches, through the exact answer cache"""
+        try:
+            cache_key, cached = self._cached_answer(cache_scope, question, matches)
+            if cached is not None:
+                return cached
+            
+            # Merge neighbouring chunks into passages that fit the context budget
+            context_chunks = pack_context(matches, self.context_max_tokens, self.chunker.tokenizer.count)
+            
+            with stage_timer("generate"):
+                answer = self._generate_answer(question, context_chunks, on_token)
             
+            return self._store_answer(cache_key, cache_scope, question_embedding, matches, answer)
         except Exception as e:
             print(f"Error querying document: {e}")
             return QueryResult(
@@ -278,23 +1029,86 @@ class RAGSystem:
                 source_chunks=[]
             )
     
-    def _generate_answer(self, question: str, context_chunks: List[str]) -> str:
-        """Generate answer using GPT-4"""
+    def _group_questions(self, selected: Dict[int, List[VectorMatch]]) -> List[List[int]]:
+        """Group questions that share retrieved chunks, up to combined_generation_size per group"""
+        groups: List[Tuple[List[int], set]] = []
+        for index, matches in selected.items():
+            chunk_ids = {match.id for match in matches}
+            for members, group_ids in groups:
+                if len(members) < self.combined_generation_size and chunk_ids & group_ids:
+                    members.append(index)
+                    group_ids |= chunk_ids
+                    break
+            else:
+                groups.append(([index], chunk_ids))
+        return [members for members, _ in groups]
+    
+    def _generate_group(self, items: List[Tuple[int, str, np.ndarray, List[VectorMatch]]],
+                        cache_scope: Optional[Tuple[str, str]], results: List[Optional[QueryResult]]):
+        """Answer related questions in one structured call, falling back to one call per question"""
+        uncached = []
+        for index, question, embedding, matches in items:
+            cache_key, cached = self._cached_answer(cache_scope, question, matches)
+            if cached is not None:
+                results[index] = cached
+            else:
+                uncached.append((index, question, embedding, matches, cache_key))
+        
+        answers = None
+        if len(uncached) > 1:
+            # Context for the group: every member's matches, each chunk once, in order of best rank
+            ranked: Dict[str, Tuple[int, VectorMatch]] = {}
+            for _, _, _, matches, _ in uncached:
+                for rank, match in enumerate(matches):
+                    if match.id not in ranked or rank < ranked[match.id][0]:
+                        ranked[match.id] = (rank, match)
+            group_matches = [match for _, match in sorted(ranked.values(), key=lambda item: item[0])]
+            context_chunks = pack_context(group_matches, self.context_max_tokens, self.chunker.tokenizer.count)
+            
+            with stage_timer("generate"):
+                answers = self._generate_answers([question for _, question, _, _, _ in uncached], context_chunks)
+            count("combined_generation" if answers else "combined_generation_fallback")
+        
+        for position, (index, question, embedding, matches, cache_key) in enumerate(uncached):
+            if answers:
+                results[index] = self._store_answer(cache_key, cache_scope, embedding, matches, answers[position])
+            else:
+                results[index] = self._generate_result(question, embedding, matches, cache_scope)
+    
+    def _answer_cache_scope(self, doc_id: Optional[str]) -> Optional[Tuple[str, str]]:
+        """(content hash, prompt version) for documents whose answers can be cached"""
+        if not self.answer_cache or not doc_id:
+            return None
+        content_hash = self.processed_documents.get(doc_id, {}).get('content_hash')
+        return (content_hash, PROMPT_VERSION) if content_hash else None
+    
+    def _fuse_lexical(self, question: str, matches: List[VectorMatch], lexical_index: BM25Index,
+                      doc_id: str, top_k: int) -> List[VectorMatch]:
+        """Merge vector matches with BM25 hits using reciprocal rank fusion"""
+        lexical_hits = lexical_index.search(question, top_k=top_k * 2)
+        fused = reciprocal_rank_fusion([
+            [match.id for match in matches],
+            [chunk_id for chunk_id, _ in lexical_hits]
+        ])[:top_k]
+        
+        # Lexical-only hits have no vector score; their text and offsets come from the chunk store
+        candidates = {match.id: match for match in matches}
+        lexical_only = [
+            VectorMatch(id=chunk_id, score=0.0, metadata={'doc_id': doc_id})
+            for chunk_id, _ in fused if chunk_id not in candidates
+        ]
+        if lexical_only:
+            for match in self._hydrate([lexical_only])[0]:
+                candidates[match.id] = match
+        return [candidates[chunk_id] for chunk_id, _ in fused if chunk_id in candidates]
+    
+    def _generate_answer(self, question: str, context_chunks: List[str],
+                         on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Generate answer using GPT-4, streaming tokens to on_token when given"""
         try:
             # Prepare context
             context = "\n---\n".join(context_chunks)
             
-            # Create prompt
-            system_prompt = """You are a helpful AI assistant specializing in policy and legal document analysis. 
-            You answer questions based ONLY on the provided context from the document. 
-            
-            Instructions:
-            1. If the answer is clearly in the context, provide a detailed and accurate response
-            2. If the answer is not in the context, state "The information is not available in the provided document"
-            3. Be specific and cite relevant details from the context
-            4. Do not make assumptions or add information not present in the context
-            5. Maintain a professional and helpful tone"""
-            
             user_prompt = f"""Context from document:
 ---
 {context}
@@ -304,32 +1118,132 @@ Question: {question}
 
 Answer:"""
             
-            response = self.client.chat.completions.create(
+            response = self.upstream.create_chat_completion(
+                estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt) + 500,
                 model="openai/gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.1,
-                max_tokens=500
+                max_tokens=500,
+                stream=on_token is not None
             )
             
-            return response.choices[0].message.content.strip()
+            if on_token is None:
+                return response.choices[0].message.content.strip()
+            
+            parts = []
+            for chunk in response:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    on_token(text)
+            return "".join(parts).strip()
             
         except Exception as e:
             print(f"Error generating answer: {e}")
+            count("generation_error")
             return f"Error generating answer: {str(e)}"
     
+    def _generate_answers(self, questions: List[str], context_chunks: List[str]) -> Optional[List[str]]:
+        """Answer several questions over a shared context in one call with a JSON schema
+        
+        Returns None when the call fails or the output does not match, so
+        the caller can answer the questions one by one instead.
+        """
+        numbered = "\n".join(f"{i + 1}. {question}" for i, question in enumerate(questions))
+        context = "\n---\n".join(context_chunks)
+        user_prompt = f"""Context from document:
+---
+{context}
+---
+
+Questions:
+{numbered}
+
+Answer every question separately. Return JSON with one entry per question, in order."""
+        
+        try:
+            response = self.upstream.create_chat_completion(
+                estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt) + 500 * len(questions),
+                model="openai/gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.1,
+                max_tokens=500 * len(questions),
+                response_format={"type": "json_schema", "json_schema": COMBINED_ANSWERS_SCHEMA}
+            )
+            entries = json.loads(response.choices[0].message.content)["answers"]
+            answers = {entry["question"]: entry["answer"].strip() for entry in entries}
+            if sorted(answers) != list(range(1, len(questions) + 1)):
+                raise ValueError(f"Expected answers to questions 1-{len(questions)}, got {sorted(answers)}")
+            return [answers[i + 1] for i in range(len(questions))]
+        except Exception as e:
+            print(f"Error generating combined answers: {e}")
+            return None
+    
     def process_questions(self, document_url: str, questions: List[str]) -> List[str]:
         """Process a document and answer multiple questions"""
         # Process document first
         if not self.process_document(document_url):
             return ["Error: Could not process document"] * len(questions)
         
-        # Answer each question
-        answers = []
-        for question in questions:
-            result = self.query_document(question)
-            answers.append(result.answer)
+        doc_id = create_document_id(document_url)
+        
+        if self.batch_retrieval and len(questions) > 1:
+            return [result.answer for result in self.query_documents(questions, doc_id=doc_id)]
+        
+        # Answer questions concurrently; results are collected in input order
+        if self.question_concurrency <= 1 or len(questions) <= 1:
+            return [self._answer_question(question, doc_id) for question in questions]
+        
+        futures = [self._submit(self.question_executor, self._answer_question, question, doc_id) for question in questions]
+        return [future.result() for future in futures]
+    
+    def stream_questions(self, document_url: str, questions: List[str], emit: Callable[[Dict[str, Any]], None],
+                         stream_tokens: bool = False):
+        """Answer questions, calling emit with each answer as soon as it is ready
+        
+        Events are {'type': 'answer', 'index', 'question', 'answer'} and, when
+        stream_tokens is set, {'type': 'token', 'index', 'text'} as the answer
+        is generated. emit is called from worker threads. Returns once every
+        question has been answered.
+        """
+        if not self.process_document(document_url):
+            for index, question in enumerate(questions):
+                emit({'type': 'answer', 'index': index, 'question': question, 'answer': "Error: Could not process document"})
+            return
+        
+        doc_id = create_document_id(document_url)
+        
+        def answer(index: int, question: str):
+            on_token = None
+            if stream_tokens:
+                on_token = lambda text: emit({'type': 'token', 'index': index, 'text': text})
+            emit({'type': 'answer', 'index': index, 'question': question, 'answer': self._answer_question(question, doc_id, on_token)})
         
-        return answers
\ No newline at end of file
+        if self.question_concurrency <= 1 or len(questions) <= 1:
+            for index, question in enumerate(questions):
+                answer(index, question)
+            return
+        
+        futures = [self._submit(self.question_executor, answer, index, question) for index, question in enumerate(questions)]
+        for future in futures:
+            future.result()
+    
+    @staticmethod
+    def _submit(executor, fn, *args):
+        """Submit work to a pool, carrying over the caller's context (request timings)"""
+        return executor.submit(copy_context().run, fn, *args)
+    
+    def _answer_question(self, question: str, doc_id: Optional[str] = None,
+                         on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Answer a single question, isolating any failure to that question"""
+        try:
+            return self.query_document(question, doc_id=doc_id, on_token=on_token).answer
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            return f"Error processing query: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,169 @@
+# app/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Dict, Any
+import numpy as np
+from .quantization import quantize_int8, dequantize_int8
+
+def normalize_cache_text(text: str) -> str:
+    """Normalize text so whitespace-only differences share a cache entry"""
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by hash(model, normalized text)
+    
+    Vectors are stored as float32 blobs in SQLite, or with quantization
+    "int8" as a float32 scale followed by int8 codes (about a quarter of
+    the size, returned dequantized). Entries of either encoding are read
+    back whatever the current setting. Entries are evicted
+    least-recently-used first once the cache grows past max_entries.
+    """
+    
+    # SQLite limits the number of bound parameters per statement
+    _query_batch = 500
+    
+    def __init__(self, path: str, max_entries: int = 200000, quantization: str = "none"):
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Unknown embedding cache quantization: {quantization}")
+        self.path = path
+        self.max_entries = max_entries
+        self.quantization = quantization
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if "encoding" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN encoding TEXT NOT NULL DEFAULT 'float32'")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address for a (model, text) pair"""
+        payload = f"{model}\0{normalize_cache_text(text)}".encode()
+        return hashlib.sha256(payload).hexdigest()
+    
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """Look up a single embedding"""
+        return self.get_many(model, [text])[0]
+    
+    def put(self, model: str, text: str, embedding: np.ndarray):
+        """Store a single embedding"""
+        self.put_many(model, [text], [embedding])
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up float32 embeddings for many texts; misses are returned as None"""
+        keys = [self.make_key(model, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        now = time.time()
+        
+        with self._lock:
+            for start in range(0, len(keys), self._query_batch):
+                batch = list(set(keys[start:start + self._query_batch]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, encoding FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, encoding in rows:
+                    found[key] = self._decode(blob, encoding)
+                if rows:
+                    hit_keys = [row[0] for row in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys]
+                    )
+            
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for result in results if result is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        
+        return results
+    
+    def put_many(self, model: str, texts: List[str], embeddings: List[np.ndarray]):
+        """Store embeddings for many texts"""
+        if not texts:
+            return
+        
+        now = time.time()
+        encoding = "int8" if self.quantization == "int8" else "float32"
+        rows = [
+            (self.make_key(model, text), self._encode(embedding), encoding, now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, encoding, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._size += self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            
+            if self._size > self.max_entries:
+                self._evict()
+    
+    def _encode(self, embedding: np.ndarray) -> bytes:
+        vector = np.asarray(embedding, dtype=np.float32)
+        if self.quantization == "int8":
+            codes, scales = quantize_int8(vector)
+            return scales.tobytes() + codes.tobytes()
+        return vector.tobytes()
+    
+    @staticmethod
+    def _decode(blob: bytes, encoding: str) -> np.ndarray:
+        if encoding == "int8":
+            scales = np.frombuffer(blob, dtype=np.float32, count=1)
+            codes = np.frombuffer(blob, dtype=np.int8, offset=4).reshape(1, -1)
+            return dequantize_int8(codes, scales)[0]
+        return np.frombuffer(blob, dtype=np.float32).copy()
+    
+    def _evict(self):
+        """Drop least recently used entries down to 90% of capacity (lock held)"""
+        target = int(self.max_entries * 0.9)
+        excess = self._size - target
+        if excess <= 0:
+            return
+        
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        remaining = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.evictions += self._size - remaining
+        self._size = remaining
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
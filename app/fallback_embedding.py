@@ -0,0 +1,81 @@
+# app/fallback_embedding.py
+import re
+from typing import List, Tuple
+import numpy as np
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+class HashedNgramEmbedder:
+    """Local embeddings from signed feature hashing of character n-grams
+    
+    Text is lowercased and reduced to alphanumerics separated by single
+    spaces; every character n-gram is hashed to a bucket and a sign, counts
+    are damped with log1p and rows are L2-normalized. A whole batch is
+    hashed in one pass over the concatenated bytes, so the cost is a few
+    NumPy operations per n-gram size regardless of how many texts there are.
+    """
+    
+    def __init__(self, dimension: int = 1536, ngram_sizes: Tuple[int, ...] = (3, 4, 5)):
+        self.dimension = dimension
+        self.ngram_sizes = ngram_sizes
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return NON_ALNUM.sub(" ", text.lower()).strip()
+    
+    @staticmethod
+    def _mix(hashes: np.ndarray) -> np.ndarray:
+        """Finalize rolling hashes so buckets and signs are well spread (uint32, in place)"""
+        hashes ^= hashes >> np.uint32(16)
+        hashes *= np.uint32(0x7FEB352D)
+        hashes ^= hashes >> np.uint32(15)
+        hashes *= np.uint32(0x846CA68B)
+        hashes ^= hashes >> np.uint32(16)
+        return hashes
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts as a (len(texts), dimension) float32 array"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return matrix
+        
+        # One padded byte string for the whole batch, plus the owning row of every byte
+        pieces = [f" {self._normalize(text)} ".encode() for text in texts]
+        data = np.frombuffer(b"".join(pieces), dtype=np.uint8).astype(np.uint32)
+        lengths = np.fromiter((len(piece) for piece in pieces), dtype=np.int64, count=len(pieces))
+        owners = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        
+        buckets = []
+        signs = []
+        rows = []
+        for n in self.ngram_sizes:
+            count = len(data) - n + 1
+            if count <= 0:
+                continue
+            # Polynomial rolling hash over each window, seeded by n (uint32 wraps around)
+            hashes = np.full(count, n * 0x9E3779B1 & 0xFFFFFFFF, dtype=np.uint32)
+            for k in range(n):
+                hashes *= np.uint32(0x01000193)
+                hashes ^= data[k:k + count]
+            self._mix(hashes)
+            
+            # Keep n-grams that lie within one text
+            valid = owners[:count] == owners[n - 1:n - 1 + count]
+            hashes = hashes[valid]
+            buckets.append(hashes % np.uint32(self.dimension))
+            signs.append(np.where(hashes & np.uint32(0x80000000), -1.0, 1.0))
+            rows.append(owners[:count][valid])
+        
+        if not buckets:
+            return matrix
+        
+        flat = np.concatenate(rows) * self.dimension + np.concatenate(buckets).astype(np.int64)
+        counts = np.bincount(flat, weights=np.concatenate(signs), minlength=matrix.size)
+        matrix[:] = counts.reshape(matrix.shape)
+        
+        # Damp repeated features, then unit-normalize each row
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
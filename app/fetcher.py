@@ -0,0 +1,273 @@
+# app/fetcher.py
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+from typing import Optional, Dict, Any, NamedTuple
+import httpx
+from .utils import create_document_id
+from .metrics import count
+
+class FetchedDocument(NamedTuple):
+    """A downloaded document on local disk"""
+    path: str
+    content_hash: str
+    size: int
+    not_modified: bool  # revalidated against the blob cache without a body download
+    temporary: bool  # deleted by release() rather than kept in the blob cache
+
+class DocumentTooLarge(Exception):
+    """Document exceeds the configured size limit"""
+
+class DocumentFetcher:
+    """Pooled async HTTP fetcher with an on-disk blob cache
+    
+    Cached documents are revalidated with If-None-Match / If-Modified-Since,
+    and interrupted downloads resume with Range + If-Range. All requests run
+    on one background event loop that owns a keep-alive connection pool
+    shared by every worker thread. Callers hand every fetched document back
+    with release(); until then its cached body is pinned against eviction.
+    """
+    
+    def __init__(self, cache_dir: str = "", max_bytes: int = 200 * 1024 * 1024,
+                 cache_max_bytes: int = 2 * 1024 ** 3, timeout: float = 30.0,
+                 retries: int = 2, max_connections: int = 20, block_size: int = 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cache_max_bytes = cache_max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.max_connections = max_connections
+        self.block_size = block_size
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        # Event loop thread and client are started on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._start_lock = threading.Lock()
+        self._key_locks: Dict[str, asyncio.Lock] = {}
+        # Cached bodies handed out and not yet released (path -> holders)
+        self._pins: Dict[str, int] = {}
+        self._pin_lock = threading.Lock()
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="document-fetcher", daemon=True).start()
+                self._loop = loop
+            return self._loop
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled client on the fetcher loop (HTTP/2 when h2 is installed)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                follow_redirects=True
+            )
+        return self._client
+    
+    def fetch(self, url: str) -> Optional[FetchedDocument]:
+        """Fetch a document from a synchronous caller; None on failure"""
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._ensure_loop()).result()
+    
+    def release(self, document: FetchedDocument):
+        """Done reading a fetched document: unpin its cached body, or delete it if temporary"""
+        if document.temporary:
+            try:
+                os.remove(document.path)
+            except FileNotFoundError:
+                pass
+            return
+        with self._pin_lock:
+            holders = self._pins.get(document.path, 0) - 1
+            if holders > 0:
+                self._pins[document.path] = holders
+            else:
+                self._pins.pop(document.path, None)
+    
+    def _pin(self, document: FetchedDocument) -> FetchedDocument:
+        with self._pin_lock:
+            self._pins[document.path] = self._pins.get(document.path, 0) + 1
+        return document
+    
+    def close(self):
+        """Close pooled connections and stop the loop thread"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+    
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".pdf", base + ".json", base + ".part", base + ".part.json"
+    
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]):
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+    
+    async def _fetch(self, url: str) -> Optional[FetchedDocument]:
+        key = create_document_id(url)
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        
+        async with lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    if self.cache_dir:
+                        return await self._fetch_cached(url, key)
+                    return await self._fetch_temporary(url)
+                except DocumentTooLarge as e:
+                    print(f"Error downloading PDF: {e}")
+                    return None
+                except FileNotFoundError as e:
+                    # Cached body evicted by another process mid-revalidation: download it again
+                    if attempt == self.retries:
+                        print(f"Error downloading PDF: {e}")
+                        return None
+                    count("document_fetch_retry")
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                    if attempt == self.retries or (status_code is not None and status_code < 500):
+                        print(f"Error downloading PDF: {e}")
+                        return None
+                    count("document_fetch_retry")
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        return None
+    
+    def _check_length(self, response: httpx.Response, offset: int = 0):
+        length = response.headers.get("content-length")
+        if length and offset + int(length) > self.max_bytes:
+            raise DocumentTooLarge(f"document is {offset + int(length)} bytes, limit is {self.max_bytes}")
+    
+    async def _stream_to(self, response: httpx.Response, f, digest, written: int) -> int:
+        """Write the response body to f, enforcing the size limit; returns total bytes"""
+        async for block in response.aiter_bytes():
+            written += len(block)
+            if written > self.max_bytes:
+                raise DocumentTooLarge(f"document exceeds {self.max_bytes} bytes")
+            digest.update(block)
+            f.write(block)
+        return written
+    
+    async def _fetch_temporary(self, url: str) -> FetchedDocument:
+        """Download into a temporary file (blob cache disabled)"""
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self._get_client().stream("GET", url) as response:
+                    response.raise_for_status()
+                    self._check_length(response)
+                    digest = hashlib.sha256()
+                    size = await self._stream_to(response, f, digest, 0)
+            return FetchedDocument(path, digest.hexdigest(), size, False, True)
+        except BaseException:
+            os.remove(path)
+            raise
+    
+    async def _fetch_cached(self, url: str, key: str) -> FetchedDocument:
+        """Revalidate, resume or download a document through the blob cache"""
+        body_path, meta_path, part_path, part_meta_path = self._paths(key)
+        meta = self._read_json(meta_path) if os.path.exists(body_path) else None
+        part_meta = self._read_json(part_meta_path) if os.path.exists(part_path) else None
+        
+        headers = {}
+        offset = 0
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        elif part_meta and (part_meta.get("etag") or part_meta.get("last_modified")):
+            offset = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = part_meta.get("etag") or part_meta["last_modified"]
+        
+        async with self._get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and meta:
+                count("document_not_modified")
+                os.utime(body_path)
+                return self._pin(FetchedDocument(body_path, meta["sha256"], meta["size"], True, False))
+            response.raise_for_status()
+            
+            # Resume only when the server honoured the range from where we stopped
+            resume = offset > 0 and response.status_code == 206 and \
+                response.headers.get("content-range", "").startswith(f"bytes {offset}-")
+            if not resume:
+                offset = 0
+            self._check_length(response, offset)
+            
+            validators = {
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified")
+            }
+            if resume:
+                validators = {"etag": part_meta.get("etag"), "last_modified": part_meta.get("last_modified")}
+                count("document_fetch_resumed")
+            self._write_json(part_meta_path, {"url": url, **validators})
+            
+            digest = hashlib.sha256()
+            if resume:
+                with open(part_path, "rb") as f:
+                    for block in iter(lambda: f.read(self.block_size), b""):
+                        digest.update(block)
+            with open(part_path, "ab" if resume else "wb") as f:
+                size = await self._stream_to(response, f, digest, offset)
+        
+        os.replace(part_path, body_path)
+        self._write_json(meta_path, {"url": url, "sha256": digest.hexdigest(), "size": size, **validators})
+        os.remove(part_meta_path)
+        document = self._pin(FetchedDocument(body_path, digest.hexdigest(), size, False, False))
+        self._evict()
+        return document
+    
+    def _evict(self):
+        """Remove least recently used unpinned documents until the cache fits its byte budget
+        
+        Other processes sharing the directory evict too, so any file may
+        disappear between listing and removal.
+        """
+        with self._pin_lock:
+            pinned = set(self._pins)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pdf"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            if path in pinned:
+                continue
+            for removed in (path, path[:-4] + ".json"):
+                try:
+                    os.remove(removed)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            count("document_cache_evicted")
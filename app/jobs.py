@@ -0,0 +1,187 @@
+# app/jobs.py
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from .models import IngestJobStatus
+from .metrics import count
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+class IngestQueueFull(Exception):
+    """The ingestion queue has no room for another job (or is shutting down)"""
+
+class IngestJob:
+    """One document ingestion request and its progress"""
+    
+    def __init__(self, document_url: str, doc_id: str):
+        self.job_id = uuid.uuid4().hex
+        self.document_url = document_url
+        self.doc_id = doc_id
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.chunks_count: Optional[int] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+    
+    def snapshot(self) -> IngestJobStatus:
+        return IngestJobStatus(
+            job_id=self.job_id,
+            document_url=self.document_url,
+            doc_id=self.doc_id,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            chunks_count=self.chunks_count
+        )
+
+class IngestQueue:
+    """Bounded queue of documents indexed by a pool of background worker threads
+    
+    ingest(url) is called on a worker and must be safe to run concurrently
+    with request handlers indexing the same document; RAGSystem collapses
+    those into one ingest, so a request for a document with a running job
+    waits for that job instead of starting its own. Finished jobs are kept
+    for status polling up to history_size. close() cancels jobs that have
+    not started and waits for running ones.
+    """
+    
+    def __init__(self, ingest: Callable[[str], bool], document_id: Callable[[str], str],
+                 chunks_count: Callable[[str], Optional[int]], workers: int = 2,
+                 max_queued: int = 100, history_size: int = 1000):
+        self._ingest = ingest
+        self._document_id = document_id
+        self._chunks_count = chunks_count
+        self.history_size = history_size
+        self._queue: "queue.Queue[Optional[IngestJob]]" = queue.Queue(maxsize=max(1, max_queued))
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._active: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._work, name=f"rag-ingest-job-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def submit(self, document_url: str) -> IngestJob:
+        """Queue a document, or return the queued/running job already covering it"""
+        doc_id = self._document_id(document_url)
+        with self._lock:
+            job = self._active.get(doc_id)
+            if job is not None:
+                return job
+            if self._closed:
+                raise IngestQueueFull("ingestion queue is shutting down")
+            
+            job = IngestJob(document_url, doc_id)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                count("ingest_queue_full")
+                raise IngestQueueFull(f"ingestion queue is full ({self._queue.maxsize} jobs)")
+            
+            self._active[doc_id] = job
+            self._jobs[job.job_id] = job
+            self._trim_history()
+        count("ingest_job_queued")
+        return job
+    
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def jobs(self) -> List[IngestJob]:
+        """Known jobs, oldest first"""
+        with self._lock:
+            return list(self._jobs.values())
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "succeeded": statuses.count(SUCCEEDED),
+            "failed": statuses.count(FAILED),
+            "cancelled": statuses.count(CANCELLED),
+            "capacity": self._queue.maxsize
+        }
+    
+    def close(self, timeout: float = 30.0):
+        """Cancel queued jobs, then stop the workers, waiting up to timeout for running jobs"""
+        with self._lock:
+            self._closed = True
+        
+        cancelled = 0
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                continue
+            job.status = CANCELLED
+            job.error = "Cancelled at shutdown"
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.doc_id) is job:
+                    del self._active[job.doc_id]
+            cancelled += 1
+        count("ingest_job_cancelled", cancelled)
+        
+        # Workers finishing a job take a sentinel each, so this never waits for long
+        for _ in self._workers:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+    
+    def _trim_history(self):
+        """Forget the oldest finished jobs beyond history_size (lock held)"""
+        excess = len(self._jobs) - self.history_size
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if not self._jobs[job_id].active:
+                del self._jobs[job_id]
+                excess -= 1
+    
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                ok = self._ingest(job.document_url)
+                job.status = SUCCEEDED if ok else FAILED
+                if ok:
+                    job.chunks_count = self._chunks_count(job.doc_id)
+                else:
+                    job.error = "Could not process document"
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    if self._active.get(job.doc_id) is job:
+                        del self._active[job.doc_id]
+                count(f"ingest_job_{job.status}")
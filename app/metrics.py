@@ -0,0 +1,169 @@
+# app/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[position] += 1
+            total[0] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += counts[-1]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text format"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"]
+)
+EVENTS = REGISTRY.counter(
+    "rag_events_total", "Cache hits/misses, fallbacks and other pipeline events", ["event"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+
+# Per-request stage totals, shared with worker threads through the copied context
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+_timings_lock = threading.Lock()
+_iter_state = threading.local()
+
+def start_request_timings() -> Dict[str, float]:
+    """Begin collecting a stage breakdown for the current request"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def record_stage(stage: str, seconds: float):
+    """Record time spent in a stage globally and for the current request"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        with _timings_lock:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+def count(event: str, amount: float = 1.0):
+    """Increment an event counter"""
+    if amount:
+        EVENTS.inc(amount, event=event)
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """Attribute the time spent producing each item of an iterator to a stage
+    
+    Timed iterators can be stacked (e.g. chunking over extracted pages); time
+    spent in an inner iterator is only counted against the inner stage.
+    """
+    iterator = iter(iterable)
+    total = 0.0
+    try:
+        while True:
+            outer_nested = getattr(_iter_state, "nested", 0.0)
+            _iter_state.nested = 0.0
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                total += elapsed - _iter_state.nested
+                _iter_state.nested = outer_nested + elapsed
+            yield item
+    finally:
+        record_stage(stage, total)
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Format a stage breakdown as a Server-Timing header value (milliseconds)"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in sorted(timings.items()))
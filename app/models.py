@@ -17,4 +17,26 @@ class DocumentChunk(BaseModel):
 class QueryResult(BaseModel):
     answer: str
     confidence: float
-    source_chunks: List[str]
\ No newline at end of file
+    source_chunks: List[str]
+
+class VectorMatch(BaseModel):
+    id: str
+    score: float
+    metadata: dict = {}
+
+class IngestRequest(BaseModel):
+    documents: List[str]  # URLs to index ahead of queries
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    document_url: str
+    doc_id: str
+    status: str  # queued, running, succeeded, failed or cancelled
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    chunks_count: Optional[int] = None
+
+class IngestResponse(BaseModel):
+    jobs: List[IngestJobStatus]
\ No newline at end of file
@@ -0,0 +1,43 @@
+# app/quantization.py
+from typing import Tuple
+import numpy as np
+
+# Bits set in each byte value, for Hamming distances between packed codes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 codes and float32 scales (row ~= codes * scale)"""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, queries: np.ndarray, block: int = 512) -> np.ndarray:
+    """Approximate queries @ rows.T from int8 codes: (queries, rows)
+    
+    Codes are widened block by block into one reused float32 buffer, so the
+    product runs on BLAS without ever materializing a float copy of all rows
+    (NumPy has no BLAS path for integer matrix products).
+    """
+    scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+    buffer = np.empty((min(block, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), block):
+        rows = buffer[:len(codes[start:start + block])]
+        np.copyto(rows, codes[start:start + block], casting='unsafe')
+        np.matmul(queries, rows.T, out=scores[:, start:start + len(rows)])
+    return scores * scales
+
+def binarize(matrix: np.ndarray) -> np.ndarray:
+    """Sign bits packed eight to a byte"""
+    return np.packbits(np.atleast_2d(matrix) > 0, axis=1)
+
+def hamming_distances(codes: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Bits differing between each packed row and each packed query: (queries, rows)"""
+    distances = np.empty((len(query_bits), len(codes)), dtype=np.int32)
+    for row, bits in enumerate(query_bits):
+        distances[row] = POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+    return distances
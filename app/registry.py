@@ -0,0 +1,155 @@
+# app/registry.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+from .metrics import count
+
+class DocumentRegistry(MutableMapping):
+    """processed_documents records shared by every worker process through SQLite (WAL)
+    
+    Maps doc_id (create_document_id) to the record written after an ingest:
+    url, chunks_count, content_hash, chunks, fallback_chunks (with
+    reembed_attempts and reembed_after), processed_at and checked_at.
+    Records survive restarts, and ingest_lock() keeps two processes from
+    ingesting the same document at once. Parsed records are cached per
+    process and reloaded only when another writer changes them.
+    Values are shared: replace a record rather than mutating it in place.
+    """
+    
+    def __init__(self, path: str, lock_ttl: float = 600.0, poll_interval: float = 0.5):
+        self.path = path
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._records: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path or ":memory:", timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, record TEXT NOT NULL, version INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_locks ("
+            "doc_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+    
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                self._records.pop(doc_id, None)
+                raise KeyError(doc_id)
+            
+            cached = self._records.get(doc_id)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1]
+            
+            row = self._conn.execute("SELECT version, record FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                raise KeyError(doc_id)
+            record = json.loads(row[1])
+            self._records[doc_id] = (row[0], record)
+            return record
+    
+    def __setitem__(self, doc_id: str, record: Dict[str, Any]):
+        version = time.time_ns()
+        payload = json.dumps(record)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, record, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(doc_id) DO UPDATE SET record = excluded.record, version = excluded.version",
+                (doc_id, payload, version)
+            )
+            self._records[doc_id] = (version, record)
+    
+    def __delitem__(self, doc_id: str):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            self._records.pop(doc_id, None)
+        if not deleted:
+            raise KeyError(doc_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            doc_ids = [row[0] for row in self._conn.execute("SELECT doc_id FROM documents")]
+        return iter(doc_ids)
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def _try_lock(self, doc_id: str) -> bool:
+        """Take or renew the ingest lock unless another live owner holds it"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT owner, expires_at FROM ingest_locks WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if row and row[0] != self.owner and row[1] > now:
+                    self._conn.execute("COMMIT")
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ingest_locks (doc_id, owner, expires_at) VALUES (?, ?, ?)",
+                    (doc_id, self.owner, now + self.lock_ttl)
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def _release(self, doc_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM ingest_locks WHERE doc_id = ? AND owner = ?", (doc_id, self.owner))
+    
+    @contextmanager
+    def ingest_lock(self, doc_id: str):
+        """Hold the cross-process ingest lock for a document, waiting while another process has it
+        
+        The lock is renewed in the background while held and expires after
+        lock_ttl if its owner dies. Re-check the record after acquiring it:
+        the previous holder may have just indexed the document.
+        """
+        if not self._try_lock(doc_id):
+            count("ingest_lock_wait")
+            while not self._try_lock(doc_id):
+                time.sleep(self.poll_interval)
+        
+        stop = threading.Event()
+        
+        def renew():
+            while not stop.wait(self.lock_ttl / 3):
+                self._try_lock(doc_id)
+        
+        renewer = threading.Thread(target=renew, name="registry-lock-renew", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+            self._release(doc_id)
+    
+    def ingesting(self) -> List[str]:
+        """Documents any process is ingesting right now"""
+        with self._lock:
+            return [
+                row[0] for row in
+                self._conn.execute("SELECT doc_id FROM ingest_locks WHERE expires_at > ?", (time.time(),))
+            ]
@@ -0,0 +1,93 @@
+# app/rerank.py
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from .bm25 import TOKEN_PATTERN, STOPWORDS
+from .models import VectorMatch
+
+class RerankResult(NamedTuple):
+    matches: List[VectorMatch]  # chunks to send to the model, best first
+    scores: List[float]  # rerank score of each kept chunk
+    found: bool  # False when no candidate looks relevant enough to answer from
+
+def _terms(text: str) -> List[str]:
+    return [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+def _min_window(positions: Dict[str, List[int]]) -> int:
+    """Length of the shortest word window containing every term in positions"""
+    events = sorted((position, term) for term, found in positions.items() for position in found)
+    needed = len(positions)
+    counts: Dict[str, int] = {}
+    best = events[-1][0] - events[0][0] + 1
+    left = 0
+    for position, term in events:
+        counts[term] = counts.get(term, 0) + 1
+        while len(counts) == needed:
+            start, first = events[left]
+            best = min(best, position - start + 1)
+            counts[first] -= 1
+            if not counts[first]:
+                del counts[first]
+            left += 1
+    return best
+
+class Reranker:
+    """Rescore retrieved chunks on CPU and choose how many to send to the model
+    
+    The score mixes the vector similarity (relative to the best candidate),
+    the share of question terms the chunk contains, how close together
+    those terms appear, and the candidate's retrieval rank. Chunks are kept
+    best first while their score stays within keep_ratio of the best and
+    does not fall by more than max_drop from the previous one. A decisive
+    top match (full term coverage and a clear margin over the runner-up)
+    is sent alone; when no candidate contains a question term and the best
+    similarity is under min_similarity, the question is reported as not
+    found without calling the model.
+    """
+    
+    def __init__(self, max_chunks: int = 5, keep_ratio: float = 0.6, max_drop: float = 0.25,
+                 decisive_margin: float = 0.3, min_similarity: float = 0.15,
+                 weights: Sequence[float] = (0.45, 0.3, 0.15, 0.1)):
+        self.max_chunks = max_chunks
+        self.keep_ratio = keep_ratio
+        self.max_drop = max_drop
+        self.decisive_margin = decisive_margin
+        self.min_similarity = min_similarity
+        self.weights = weights
+    
+    def rerank(self, question: str, matches: List[VectorMatch], max_chunks: Optional[int] = None) -> RerankResult:
+        if not matches:
+            return RerankResult([], [], False)
+        
+        query_terms = set(_terms(question))
+        best_similarity = max(match.score for match in matches)
+        w_vector, w_coverage, w_proximity, w_rank = self.weights
+        
+        scored = []
+        for rank, match in enumerate(matches):
+            positions: Dict[str, List[int]] = {}
+            for position, term in enumerate(_terms((match.metadata or {}).get('text', ''))):
+                if term in query_terms:
+                    positions.setdefault(term, []).append(position)
+            
+            coverage = len(positions) / len(query_terms) if query_terms else 0.0
+            proximity = len(positions) / _min_window(positions) if len(positions) > 1 else float(bool(positions))
+            similarity = match.score / best_similarity if best_similarity > 0 else 0.0
+            score = (w_vector * similarity + w_coverage * coverage + w_proximity * proximity
+                     + w_rank * (1 - rank / len(matches)))
+            scored.append((score, coverage, match))
+        
+        scored.sort(key=lambda item: item[0], reverse=True)
+        best_score, best_coverage, _ = scored[0]
+        
+        if best_similarity < self.min_similarity and not any(coverage for _, coverage, _ in scored):
+            return RerankResult([], [], False)
+        
+        if best_coverage == 1.0 and (len(scored) == 1 or best_score - scored[1][0] >= self.decisive_margin * best_score):
+            return RerankResult([scored[0][2]], [best_score], True)
+        
+        limit = max_chunks or self.max_chunks
+        kept = [scored[0]]
+        for item in scored[1:limit]:
+            if item[0] < best_score * self.keep_ratio or item[0] < kept[-1][0] * (1 - self.max_drop):
+                break
+            kept.append(item)
+        return RerankResult([match for _, _, match in kept], [score for score, _, _ in kept], True)
@@ -0,0 +1,45 @@
+# app/singleflight.py
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single execution
+    
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait on the same future and receive its result or exception.
+    The key is released as soon as the call finishes, so a failed call can be
+    retried by the next caller.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+    
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) once per key among concurrent callers"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+    
+    def in_flight(self) -> List[str]:
+        """Keys currently being executed"""
+        with self._lock:
+            return list(self._calls)
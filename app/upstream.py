@@ -0,0 +1,221 @@
+# app/upstream.py
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Callable, Optional
+from .metrics import count, record_stage
+
+# Errors that are the caller's fault: retrying them only adds load
+NON_RETRYABLE = (TypeError, ValueError, KeyError, AttributeError)
+
+class CircuitOpen(Exception):
+    """The upstream endpoint failed repeatedly; calls are refused until it cools down"""
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error, if it carries one"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def retryable(error: Exception) -> bool:
+    """Whether an error is transient (rate limit, timeout, server or connection error)"""
+    if isinstance(error, (CircuitOpen,) + NON_RETRYABLE):
+        return False
+    status = status_code(error)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute
+    
+    reserve() takes tokens immediately (the balance may go negative) and
+    returns how long the caller must wait before using them, so waiting
+    callers are served in arrival order. A rate of 0 disables the bucket.
+    """
+    
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds one probe call is let through"""
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+    
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+                if self._opened_at is None or self._probing:
+                    count(f"{self.name}_circuit_opened")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class Endpoint:
+    """Rate limits, retry policy and circuit breaker for one kind of upstream call"""
+    
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0, hedge_after: float = 0.0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.hedge_after = hedge_after
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def pause(self, seconds: float):
+        """Hold every caller back after a rate-limit response"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    def wait_turn(self, tokens: int):
+        """Block until the rate limits allow one request of about this many tokens"""
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            delay = max(delay, self._paused_until - time.monotonic())
+        if delay > 0:
+            count(f"{self.name}_rate_limit_wait")
+            record_stage("rate_limit_wait", delay)
+            time.sleep(delay)
+
+class UpstreamClient:
+    """Shared gate in front of an OpenAI-compatible client
+    
+    Every call waits for its endpoint's request and token buckets, is
+    retried on rate limits, timeouts and server errors with capped
+    exponential backoff and full jitter (honouring Retry-After), and
+    feeds the endpoint's circuit breaker. While a breaker is open, calls
+    fail fast with CircuitOpen so callers switch straight to their local
+    fallback instead of adding load. Non-streaming chat calls can be
+    hedged: if the first attempt is slower than hedge_after seconds, a
+    second one is started and the first to succeed wins.
+    """
+    
+    def __init__(self, client, embeddings: Endpoint, chat: Endpoint, hedge_workers: int = 8):
+        self.client = client
+        self.embeddings = embeddings
+        self.chat = chat
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="upstream-hedge")
+    
+    def create_embeddings(self, tokens: int, **kwargs) -> Any:
+        return self._call(self.embeddings, tokens, lambda: self.client.embeddings.create(**kwargs))
+    
+    def create_chat_completion(self, tokens: int, **kwargs) -> Any:
+        hedge = not kwargs.get('stream') and self.chat.hedge_after > 0
+        return self._call(self.chat, tokens, lambda: self.client.chat.completions.create(**kwargs), hedge)
+    
+    def close(self):
+        self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _call(self, endpoint: Endpoint, tokens: int, fn: Callable[[], Any], hedge: bool = False) -> Any:
+        attempt = 0
+        while True:
+            if not endpoint.breaker.allow():
+                count(f"{endpoint.name}_circuit_rejected")
+                raise CircuitOpen(f"{endpoint.name} upstream is unavailable (circuit open)")
+            
+            endpoint.wait_turn(tokens)
+            try:
+                result = self._hedged(endpoint, tokens, fn) if hedge else fn()
+                endpoint.breaker.record_success()
+                return result
+            except Exception as e:
+                if not retryable(e):
+                    # The provider answered; the request itself is bad
+                    endpoint.breaker.record_success()
+                    raise
+                
+                endpoint.breaker.record_failure()
+                if attempt >= endpoint.max_retries:
+                    raise
+                
+                retry_after = self._retry_after(e)
+                delay = retry_after if retry_after is not None else \
+                    random.uniform(0, min(endpoint.backoff_max, endpoint.backoff_base * 2 ** attempt))
+                if status_code(e) == 429:
+                    count(f"{endpoint.name}_rate_limited")
+                    endpoint.pause(delay)
+                else:
+                    time.sleep(delay)
+                count(f"{endpoint.name}_retry")
+                attempt += 1
+    
+    def _hedged(self, endpoint: Endpoint, tokens: int, fn: Callable[[], Any]) -> Any:
+        """Run fn, starting a backup call if the first is slower than hedge_after"""
+        primary = self._hedge_executor.submit(copy_context().run, fn)
+        done, _ = wait([primary], timeout=endpoint.hedge_after)
+        if done:
+            return primary.result()
+        
+        count(f"{endpoint.name}_hedged")
+        endpoint.wait_turn(tokens)
+        pending = {primary, self._hedge_executor.submit(copy_context().run, fn)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            value = headers.get('retry-after')
+            return min(float(value), 60.0) if value is not None else None
+        except (TypeError, ValueError):
+            return None
@@ -1,74 +1,99 @@
 # app/utils.py
-import requests
 import os
 import hashlib
-from typing import Optional, List
-import PyPDF2
+from concurrent.futures import Executor
+from typing import List, Iterator, Union
 from io import BytesIO
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-def download_pdf(url: str) -> Optional[bytes]:
-    """Download PDF from URL and return bytes"""
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        print(f"Error downloading PDF: {e}")
-        return None
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+    """Yield the text of each page of a PDF file, one page at a time"""
+    import PyPDF2
+    
+    with open(pdf_path, "rb") as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    """Extract text from PDF bytes"""
-    try:
-        pdf_file = BytesIO(pdf_bytes)
+def count_pdf_pages(pdf_path: str) -> int:
+    """Number of pages in a PDF file"""
+    import PyPDF2
+    
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def extract_page_range(source: Union[str, bytes], start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end) from a PDF path or bytes (runs in worker processes)"""
+    import PyPDF2
+    
+    pdf_file = BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+    with pdf_file:
         pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, min(end, len(pdf_reader.pages)))]
+
+def iter_pdf_pages_parallel(source: Union[str, bytes], page_count: int, executor: Executor, workers: int) -> Iterator[str]:
+    """Extract page ranges across a process pool and yield page text in page order"""
+    # A few ranges per worker keeps the pool busy when some pages are much heavier than others
+    tasks = max(1, workers * 4)
+    step = max(1, -(-page_count // tasks))
+    futures = [
+        executor.submit(extract_page_range, source, start, start + step)
+        for start in range(0, page_count, step)
+    ]
+    
+    try:
+        for future in futures:
+            for page in future.result():
+                yield page
+    finally:
+        for future in futures:
+            future.cancel()
+
+# Query parameters that sign or expire a URL without changing what it points to
+SIGNING_PARAMS = {
+    'sv', 'ss', 'srt', 'sp', 'se', 'st', 'spr', 'sig', 'sr', 'si', 'sdd',
+    'skoid', 'sktid', 'skt', 'ske', 'sks', 'skv',
+    'signature', 'expires', 'token', 'awsaccesskeyid'
+}
+SIGNING_PREFIXES = ('x-amz-', 'x-goog-')
+
+def document_key(url: str) -> str:
+    """URL with signing/expiry query parameters and the fragment removed"""
+    parts = urlsplit(url)
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in SIGNING_PARAMS and not name.lower().startswith(SIGNING_PREFIXES)
+    ]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
 
 def create_document_id(url: str) -> str:
-    """Create a unique document ID from URL"""
-    return hashlib.md5(url.encode()).hexdigest()
+    """Create a document ID from the URL, stable across re-signed links"""
+    return hashlib.md5(document_key(url).encode()).hexdigest()
+
+def hash_chunk(text: str) -> str:
+    """Short content hash identifying a chunk's text"""
+    return hashlib.sha256(text.encode()).hexdigest()[:20]
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Split text into overlapping chunks"""
-    if len(text) <= chunk_size:
-        return [text]
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting requests (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+def batch_for_embedding(texts: List[str], max_items: int = 128, max_tokens: int = 100000) -> List[List[int]]:
+    """Group text positions into batches capped by item count and estimated tokens"""
+    batches = []
+    current = []
+    current_tokens = 0
     
-    chunks = []
-    start = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
     
-    while start < len(text):
-        end = start + chunk_size
-        
-        # Try to break at sentence boundary
-        if end < len(text):
-            # Look for sentence endings near the chunk boundary
-            for i in range(min(100, chunk_size // 4)):
-                if text[end - i] in '.!?':
-                    end = end - i + 1
-                    break
-        
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        
-        start = end - overlap
-        
-        if start >= len(text):
-            break
+    if current:
+        batches.append(current)
     
-    return chunks
-
-def clean_text(text: str) -> str:
-    """Clean and normalize text"""
-    # Remove extra whitespace and normalize
-    import re
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-    return text
\ No newline at end of file
+    return batches
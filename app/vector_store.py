@@ -0,0 +1,414 @@
+# app/vector_store.py
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .models import VectorMatch
+from .quantization import quantize_int8, int8_scores, binarize, hamming_distances
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+class VectorStore:
+    """Interface for vector index backends"""
+    
+    name = "base"
+    
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Insert or replace vectors given as {'id', 'values', 'metadata'} dicts (values as float32 arrays)"""
+        raise NotImplementedError
+    
+    def query(self, vector: np.ndarray, top_k: int = 5, doc_id: Optional[str] = None) -> List[VectorMatch]:
+        """Return the top_k most similar vectors, optionally restricted to one document"""
+        raise NotImplementedError
+    
+    def query_many(self, vectors: np.ndarray, top_k: int = 5,
+                   doc_id: Optional[str] = None) -> List[List[VectorMatch]]:
+        """Run several queries together; results are in input order"""
+        return [self.query(vector, top_k=top_k, doc_id=doc_id) for vector in vectors]
+    
+    def fetch(self, ids: List[str], doc_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Return stored values for the ids that exist; doc_id is the document they belong to"""
+        raise NotImplementedError
+    
+    def delete(self, ids: List[str], doc_id: Optional[str] = None):
+        """Remove vectors by id; doc_id is the document they belong to"""
+        raise NotImplementedError
+    
+    def flush(self):
+        """Persist any buffered writes"""
+        pass
+
+class PineconeVectorStore(VectorStore):
+    """Remote Pinecone serverless index"""
+    
+    name = "pinecone"
+    
+    def __init__(self, api_key: Optional[str], index_name: str, dimension: int, index=None,
+                 ready_timeout: float = 120.0):
+        self.index_name = index_name
+        self.dimension = dimension
+        self.ready_timeout = ready_timeout
+        self.upsert_batch_size = 100
+        self.delete_batch_size = 1000
+        self._query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pinecone-query")
+        
+        # An index handle can be injected (e.g. a local stand-in); otherwise connect
+        self.index = index if index is not None else self._setup_index(api_key)
+    
+    def _setup_index(self, api_key: Optional[str]):
+        """Create the index if needed and return a handle to it"""
+        from pinecone import Pinecone, ServerlessSpec
+        
+        try:
+            pc = Pinecone(api_key=api_key)
+            
+            # Check if index exists
+            existing_indexes = [index.name for index in pc.list_indexes()]
+            
+            if self.index_name not in existing_indexes:
+                pc.create_index(
+                    name=self.index_name,
+                    dimension=self.dimension,
+                    metric='cosine',
+                    spec=ServerlessSpec(
+                        cloud='aws',
+                        region='us-east-1'
+                    )
+                )
+            
+            self._wait_until_ready(pc)
+            return pc.Index(self.index_name)
+        except Exception as e:
+            print(f"Error setting up Pinecone: {e}")
+            raise
+    
+    def _wait_until_ready(self, pc):
+        """Poll describe_index with backoff until the index reports ready"""
+        deadline = time.monotonic() + self.ready_timeout
+        delay = 0.25
+        while True:
+            status = pc.describe_index(self.index_name).status
+            ready = status.get('ready') if isinstance(status, dict) else getattr(status, 'ready', False)
+            if ready:
+                return
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Pinecone index {self.index_name} not ready after {self.ready_timeout:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+    
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Upsert in batches; values become plain lists only for the request payload"""
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            self.index.upsert(vectors=[
+                {**vector, 'values': np.asarray(vector['values'], dtype=np.float32).tolist()}
+                for vector in vectors[i:i + self.upsert_batch_size]
+            ])
+    
+    def fetch(self, ids: List[str], doc_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Fetch by id in batches"""
+        values = {}
+        for i in range(0, len(ids), self.upsert_batch_size):
+            response = self.index.fetch(ids=ids[i:i + self.upsert_batch_size])
+            for vector_id, vector in response.vectors.items():
+                values[vector_id] = np.asarray(vector.values, dtype=np.float32)
+        return values
+    
+    def delete(self, ids: List[str], doc_id: Optional[str] = None):
+        """Delete by id in batches"""
+        for i in range(0, len(ids), self.delete_batch_size):
+            self.index.delete(ids=ids[i:i + self.delete_batch_size])
+    
+    def query(self, vector: np.ndarray, top_k: int = 5, doc_id: Optional[str] = None) -> List[VectorMatch]:
+        """Query Pinecone, filtering on doc_id metadata when given"""
+        kwargs = {}
+        if doc_id:
+            kwargs['filter'] = {'doc_id': {'$eq': doc_id}}
+        
+        results = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            include_metadata=True,
+            **kwargs
+        )
+        
+        return [
+            VectorMatch(id=match.id, score=match.score, metadata=dict(match.metadata or {}))
+            for match in results.matches
+        ]
+    
+    def query_many(self, vectors: np.ndarray, top_k: int = 5,
+                   doc_id: Optional[str] = None) -> List[List[VectorMatch]]:
+        """Issue the queries concurrently"""
+        return list(self._query_executor.map(lambda vector: self.query(vector, top_k=top_k, doc_id=doc_id), vectors))
+
+class _LocalDocument:
+    """Unit-normalized float32 matrix plus ids, metadata and optional quantized codes for one document"""
+    
+    def __init__(self, ids: List[str], metadata: List[Dict[str, Any]], matrix: np.ndarray,
+                 quantization: str = "none"):
+        self.ids = ids
+        self.metadata = metadata
+        self.matrix = matrix
+        self.positions = {vector_id: i for i, vector_id in enumerate(ids)}
+        # Identity of the sidecar file this was loaded from or flushed to (None: only in memory)
+        self.stamp: Optional[Tuple[int, int, int]] = None
+        self.codes = self.scales = None
+        if quantization == "int8":
+            self.codes, self.scales = quantize_int8(matrix)
+        elif quantization == "binary":
+            self.codes = binarize(matrix)
+
+class LocalVectorStore(VectorStore):
+    """In-process cosine search over per-document NumPy matrices
+    
+    Each document is persisted as a .npy matrix and a JSON sidecar and is
+    loaded back memory-mapped, so only the pages touched by a search are read.
+    Every flush writes a new matrix file and then swaps in a sidecar naming
+    it, so readers always see a matching pair; other processes notice the
+    new sidecar on their next access and reload the document.
+    With quantization "int8" (1 byte per dimension) or "binary" (1 bit per
+    dimension), only the compact codes are kept in memory: a search scores
+    all rows on the codes, then rescores the best top_k * rescore_factor
+    rows with the full-precision vectors read from the mapped matrix.
+    """
+    
+    name = "local"
+    
+    def __init__(self, directory: str, dimension: int, quantization: str = "none",
+                 rescore_factor: Optional[int] = None):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        self.directory = directory
+        self.dimension = dimension
+        self.quantization = quantization
+        # Sign bits lose more ranking detail than int8 codes, so binary search shortlists more rows
+        self.rescore_factor = rescore_factor or (10 if quantization == "binary" else 4)
+        self._documents: Dict[str, _LocalDocument] = {}
+        # Upserted rows not yet merged into their document's matrix: doc_id -> id -> (row, metadata)
+        self._pending: Dict[str, Dict[str, Tuple[np.ndarray, Dict[str, Any]]]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _paths(self, doc_id: str):
+        base = os.path.join(self.directory, doc_id)
+        return base + ".npy", base + ".json"
+    
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def _load(self, doc_id: str) -> Optional[_LocalDocument]:
+        """Return a document from memory, reloading it when another process flushed a newer version (lock held)"""
+        document = self._documents.get(doc_id)
+        if document is not None and doc_id in self._dirty:
+            return document
+        
+        legacy_matrix_path, meta_path = self._paths(doc_id)
+        for _ in range(3):
+            stamp = self._stamp(meta_path)
+            if document is not None and document.stamp == stamp:
+                return document
+            if stamp is None:
+                self._documents.pop(doc_id, None)
+                return None
+            try:
+                with open(meta_path) as f:
+                    sidecar = json.load(f)
+                # Sidecars written before matrix files were versioned use the fixed name
+                matrix_name = sidecar.get('matrix')
+                matrix_path = os.path.join(self.directory, matrix_name) if matrix_name else legacy_matrix_path
+                matrix = np.load(matrix_path, mmap_mode='r')
+            except FileNotFoundError:
+                # Replaced by a newer flush while we were reading; look again
+                continue
+            document = _LocalDocument(sidecar['ids'], sidecar['metadata'], matrix, self.quantization)
+            document.stamp = stamp
+            self._documents[doc_id] = document
+            return document
+        return document
+    
+    def _current(self, doc_id: str) -> Optional[_LocalDocument]:
+        """Return a document with its pending upserts merged in (lock held)
+        
+        Rows are buffered by upsert() and merged here in one pass, so indexing
+        a document in many batches copies and quantizes its matrix once
+        instead of once per batch.
+        """
+        document = self._load(doc_id)
+        pending = self._pending.pop(doc_id, None)
+        if not pending:
+            return document
+        
+        ids = list(document.ids) if document else []
+        metadata = list(document.metadata) if document else []
+        positions = dict(document.positions) if document else {}
+        appended = [vector_id for vector_id in pending if vector_id not in positions]
+        
+        matrix = np.empty((len(ids) + len(appended), self.dimension), dtype=np.float32)
+        if document:
+            matrix[:len(ids)] = document.matrix
+        for vector_id in appended:
+            positions[vector_id] = len(ids)
+            ids.append(vector_id)
+            metadata.append({})
+        for vector_id, (row, row_metadata) in pending.items():
+            matrix[positions[vector_id]] = row
+            metadata[positions[vector_id]] = row_metadata
+        
+        document = _LocalDocument(ids, metadata, matrix, self.quantization)
+        self._documents[doc_id] = document
+        return document
+    
+    def _doc_ids(self, doc_id: Optional[str]) -> List[str]:
+        """The given document, or every document on disk or in memory (lock held)"""
+        if doc_id:
+            return [doc_id]
+        return sorted(set(self._stored_doc_ids()) | set(self._documents) | set(self._pending))
+    
+    def _stored_doc_ids(self) -> List[str]:
+        return [name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")]
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Add or replace vectors in memory; call flush() to persist"""
+        by_doc: Dict[str, List[Dict[str, Any]]] = {}
+        for vector in vectors:
+            doc_id = vector.get('metadata', {}).get('doc_id', '_default')
+            by_doc.setdefault(doc_id, []).append(vector)
+        
+        with self._lock:
+            for doc_id, items in by_doc.items():
+                rows = self._normalize(np.asarray([item['values'] for item in items], dtype=np.float32))
+                pending = self._pending.setdefault(doc_id, {})
+                for item, row in zip(items, rows):
+                    pending[item['id']] = (row, item.get('metadata', {}))
+                self._dirty.add(doc_id)
+    
+    def fetch(self, ids: List[str], doc_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Return stored (unit-normalized) values"""
+        values = {}
+        with self._lock:
+            for current in self._doc_ids(doc_id):
+                # Read buffered rows directly so fetching during an ingest does not merge them early
+                pending = self._pending.get(current, {})
+                document = self._load(current)
+                for vector_id in ids:
+                    if vector_id in pending:
+                        values[vector_id] = pending[vector_id][0].copy()
+                    elif document is not None and vector_id in document.positions:
+                        values[vector_id] = np.array(document.matrix[document.positions[vector_id]], dtype=np.float32)
+        return values
+    
+    def delete(self, ids: List[str], doc_id: Optional[str] = None):
+        """Drop vectors from a document in memory; call flush() to persist"""
+        targets = set(ids)
+        with self._lock:
+            for current in self._doc_ids(doc_id):
+                document = self._current(current)
+                if document is None or not targets.intersection(document.positions):
+                    continue
+                keep = [i for i, vector_id in enumerate(document.ids) if vector_id not in targets]
+                self._documents[current] = _LocalDocument(
+                    [document.ids[i] for i in keep],
+                    [document.metadata[i] for i in keep],
+                    np.array(document.matrix[keep], dtype=np.float32).reshape(len(keep), self.dimension),
+                    self.quantization
+                )
+                self._dirty.add(current)
+    
+    def flush(self):
+        """Write changed documents to disk atomically"""
+        with self._lock:
+            for doc_id in list(self._dirty):
+                document = self._current(doc_id)
+                if document is None:
+                    self._dirty.discard(doc_id)
+                    continue
+                _, meta_path = self._paths(doc_id)
+                matrix_name = f"{doc_id}.{uuid.uuid4().hex[:12]}.npy"
+                matrix_path = os.path.join(self.directory, matrix_name)
+                
+                with open(matrix_path + ".tmp", "wb") as f:
+                    np.save(f, np.ascontiguousarray(document.matrix, dtype=np.float32))
+                with open(meta_path + ".tmp", "w") as f:
+                    json.dump({'ids': document.ids, 'metadata': document.metadata, 'matrix': matrix_name}, f)
+                os.replace(matrix_path + ".tmp", matrix_path)
+                os.replace(meta_path + ".tmp", meta_path)
+                self._remove_matrices(doc_id, keep=matrix_name)
+                
+                # Serve from the mapped file from now on; only the codes stay resident
+                mapped = _LocalDocument(document.ids, document.metadata, np.load(matrix_path, mmap_mode='r'))
+                mapped.codes, mapped.scales = document.codes, document.scales
+                mapped.stamp = self._stamp(meta_path)
+                self._documents[doc_id] = mapped
+                self._dirty.discard(doc_id)
+    
+    def _remove_matrices(self, doc_id: str, keep: str):
+        """Delete superseded matrix files of a document (open memory maps stay readable)"""
+        for name in os.listdir(self.directory):
+            if name != keep and name.endswith(".npy") and (name == f"{doc_id}.npy" or name.startswith(f"{doc_id}.")):
+                os.remove(os.path.join(self.directory, name))
+    
+    def query(self, vector: np.ndarray, top_k: int = 5, doc_id: Optional[str] = None) -> List[VectorMatch]:
+        """Cosine top-k using argpartition"""
+        return self.query_many([vector], top_k=top_k, doc_id=doc_id)[0]
+    
+    def query_many(self, vectors: np.ndarray, top_k: int = 5,
+                   doc_id: Optional[str] = None) -> List[List[VectorMatch]]:
+        """Score all queries against each document in one matrix product"""
+        with self._lock:
+            documents = [document for document in (self._current(d) for d in self._doc_ids(doc_id)) if document is not None]
+        
+        if not documents or len(vectors) == 0:
+            return [[] for _ in vectors]
+        
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32))
+        
+        candidates = [[] for _ in vectors]
+        for document in documents:
+            if len(document.ids) == 0:
+                continue
+            shortlist = top_k * self.rescore_factor
+            if document.codes is None or len(document.ids) <= shortlist:
+                scores = queries @ document.matrix.T
+                k = min(top_k, scores.shape[1])
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                for row, positions in enumerate(top):
+                    for position in positions:
+                        candidates[row].append((float(scores[row, position]), document, int(position)))
+                continue
+            
+            # Two-phase: shortlist on the quantized codes, rescore the shortlist at full precision
+            if document.scales is not None:
+                approximate = int8_scores(document.codes, document.scales, queries)
+            else:
+                approximate = -hamming_distances(document.codes, binarize(queries)).astype(np.float32)
+            top = np.argpartition(-approximate, shortlist - 1, axis=1)[:, :shortlist]
+            for row, positions in enumerate(top):
+                positions = np.sort(positions)
+                exact = np.asarray(document.matrix[positions], dtype=np.float32) @ queries[row]
+                for position, score in zip(positions, exact):
+                    candidates[row].append((float(score), document, int(position)))
+        
+        results = []
+        for row in candidates:
+            row.sort(key=lambda candidate: candidate[0], reverse=True)
+            results.append([
+                VectorMatch(id=document.ids[position], score=score, metadata=document.metadata[position])
+                for score, document, position in row[:top_k]
+            ])
+        return results
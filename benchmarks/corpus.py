@@ -0,0 +1,123 @@
+# benchmarks/corpus.py
+import functools
+import http.server
+import random
+import threading
+from typing import List, Tuple
+
+TOPICS = [
+    "grace period", "waiting period", "maternity expenses", "pre-existing diseases", "room rent",
+    "ambulance charges", "organ donor", "cataract surgery", "no claim discount", "health check-up",
+    "AYUSH treatment", "domiciliary hospitalisation", "day care procedures", "co-payment", "sum insured"
+]
+
+CLAUSE_TEMPLATES = [
+    "Section {section}: The {topic} under this policy is {value} days from the date of {event}.",
+    "The Company shall pay for {topic} up to {value} percent of the sum insured, subject to clause {section}.",
+    "Expenses related to {topic} are excluded during the first {value} months of continuous coverage.",
+    "Claims for {topic} must be intimated within {value} days of {event}, as set out in Section {section}.",
+    "A {topic} benefit of Rs. {value},000 is available once per policy year under clause {section}.",
+]
+
+EVENTS = ["policy inception", "discharge", "admission", "renewal", "premium due date"]
+
+LINES_PER_PAGE = 45
+CHARS_PER_LINE = 95
+
+def generate_pages(page_count: int, seed: int = 0) -> List[List[str]]:
+    """Deterministic policy-style text, as a list of lines per page"""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(page_count):
+        lines = []
+        sentence_count = 0
+        while len(lines) < LINES_PER_PAGE:
+            sentence_count += 1
+            sentence = rng.choice(CLAUSE_TEMPLATES).format(
+                section=f"{page + 1}.{sentence_count}",
+                topic=rng.choice(TOPICS),
+                value=rng.randint(2, 90),
+                event=rng.choice(EVENTS)
+            )
+            # Wrap to fixed-width lines the way a typeset page would
+            while sentence:
+                lines.append(sentence[:CHARS_PER_LINE])
+                sentence = sentence[CHARS_PER_LINE:]
+        pages.append(lines[:LINES_PER_PAGE])
+    return pages
+
+def generate_questions(count: int, seed: int = 0) -> List[str]:
+    """Questions in the style of the evaluation set"""
+    rng = random.Random(seed + 1)
+    templates = [
+        "What is the {topic} under this policy?",
+        "Does the policy cover {topic}, and what are the conditions?",
+        "Is there a waiting period for {topic}?",
+        "What is the limit on {topic}?",
+    ]
+    return [rng.choice(templates).format(topic=rng.choice(TOPICS)) for _ in range(count)]
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def build_pdf(pages: List[List[str]]) -> bytes:
+    """Write a minimal uncompressed PDF with one Helvetica text stream per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        content = ("BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET").encode("latin-1")
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(output)
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class CorpusServer:
+    """Serve synthetic PDFs over HTTP on localhost so ingestion runs its real download path"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    
+    def add_document(self, name: str, page_count: int, seed: int = 0) -> Tuple[str, int]:
+        """Write a synthetic PDF and return (url, size in bytes)"""
+        pdf = build_pdf(generate_pages(page_count, seed))
+        with open(f"{self.directory}/{name}", "wb") as f:
+            f.write(pdf)
+        return f"{self.url}/{name}", len(pdf)
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def __enter__(self) -> "CorpusServer":
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,200 @@
+# benchmarks/fakes.py
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+class FakeAPIError(Exception):
+    """Injected upstream failure"""
+
+class LatencyModel:
+    """Injected latency and error rate for a fake upstream service
+    
+    Each call sleeps base_ms + per_item_ms * items (with +/- jitter) and then
+    fails with probability error_rate. The random source is seeded so runs
+    are repeatable.
+    """
+    
+    def __init__(self, base_ms: float = 0.0, per_item_ms: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.per_item_ms = per_item_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+    
+    def apply(self, items: int = 1):
+        with self._lock:
+            self.calls += 1
+            spread = 1.0 + self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        
+        delay = (self.base_ms + self.per_item_ms * items) * spread / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise FakeAPIError("injected upstream error")
+
+def hashed_embedding(text: str, dimension: int = 1536) -> List[float]:
+    """Deterministic bag-of-words embedding, so similar texts get similar vectors"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimension
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+class _FakeEmbeddings:
+    def __init__(self, latency: LatencyModel, dimension: int):
+        self.latency = latency
+        self.dimension = dimension
+    
+    def create(self, model: str, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.latency.apply(len(texts))
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=hashed_embedding(text, self.dimension)) for i, text in enumerate(texts)],
+            model=model
+        )
+
+class _FakeChatCompletions:
+    def __init__(self, latency: LatencyModel, answer_tokens: int):
+        self.latency = latency
+        self.answer_tokens = answer_tokens
+    
+    def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        prompt = messages[-1]["content"]
+        response_format = kwargs.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            return self._combined(prompt)
+        
+        question = prompt.rsplit("Question:", 1)[-1].split("Answer:", 1)[0].strip()
+        content = self._answer(question)
+        
+        if not stream:
+            self.latency.apply(self.answer_tokens)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        
+        return self._stream(content)
+    
+    def _answer(self, question: str) -> str:
+        words = [f"token{i}" for i in range(self.answer_tokens)]
+        return f"Answer to '{question[:80]}': " + " ".join(words)
+    
+    def _combined(self, prompt: str):
+        """Answer the numbered questions of a combined prompt in the {"answers": [...]} schema shape"""
+        listed = prompt.rsplit("Questions:", 1)[-1]
+        questions = [(int(number), question) for number, question in re.findall(r"^(\d+)\. (.*)$", listed, re.MULTILINE)]
+        self.latency.apply(self.answer_tokens * len(questions))
+        content = json.dumps({"answers": [{"question": number, "answer": self._answer(question)} for number, question in questions]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    
+    def _stream(self, content: str):
+        # Time to first token, then per-token latency
+        self.latency.apply(0)
+        for word in content.split(" "):
+            if self.latency.per_item_ms:
+                time.sleep(self.latency.per_item_ms / 1000.0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+class FakeOpenAI:
+    """Local stand-in for the OpenAI client used by RAGSystem"""
+    
+    def __init__(self, embedding_latency: Optional[LatencyModel] = None, chat_latency: Optional[LatencyModel] = None,
+                 dimension: int = 1536, answer_tokens: int = 60):
+        self.embedding_latency = embedding_latency or LatencyModel()
+        self.chat_latency = chat_latency or LatencyModel()
+        self.embeddings = _FakeEmbeddings(self.embedding_latency, dimension)
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(self.chat_latency, answer_tokens))
+
+class FakePineconeIndex:
+    """Local stand-in for a Pinecone index handle (upsert/query/fetch/delete)"""
+    
+    def __init__(self, latency: Optional[LatencyModel] = None):
+        self.latency = latency or LatencyModel()
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs):
+        self.latency.apply(len(vectors))
+        with self._lock:
+            for vector in vectors:
+                values = np.asarray(vector["values"], dtype=np.float32)
+                norm = np.linalg.norm(values)
+                self._vectors[vector["id"]] = values / norm if norm > 0 else values
+                self._metadata[vector["id"]] = dict(vector.get("metadata") or {})
+        return SimpleNamespace(upserted_count=len(vectors))
+    
+    def _matches_filter(self, metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+        for key, condition in (filter or {}).items():
+            expected = condition.get("$eq") if isinstance(condition, dict) else condition
+            if metadata.get(key) != expected:
+                return False
+        return True
+    
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[Dict[str, Any]] = None, **kwargs):
+        self.latency.apply(1)
+        with self._lock:
+            ids = [vector_id for vector_id, metadata in self._metadata.items() if self._matches_filter(metadata, filter)]
+            matrix = np.stack([self._vectors[vector_id] for vector_id in ids]) if ids else None
+            metadata = [self._metadata[vector_id] for vector_id in ids]
+        
+        if matrix is None:
+            return SimpleNamespace(matches=[])
+        
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = matrix @ (query / norm if norm > 0 else query)
+        order = np.argsort(-scores)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(
+                id=ids[i],
+                score=float(scores[i]),
+                metadata=dict(metadata[i]) if include_metadata else None
+            )
+            for i in order
+        ])
+    
+    def fetch(self, ids: List[str], **kwargs):
+        self.latency.apply(len(ids))
+        with self._lock:
+            return SimpleNamespace(vectors={
+                vector_id: SimpleNamespace(
+                    id=vector_id,
+                    values=self._vectors[vector_id].tolist(),
+                    metadata=dict(self._metadata[vector_id])
+                )
+                for vector_id in ids if vector_id in self._vectors
+            })
+    
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None, **kwargs):
+        self.latency.apply(len(ids or []))
+        with self._lock:
+            targets = list(ids or [])
+            if filter:
+                targets += [vector_id for vector_id, metadata in self._metadata.items() if self._matches_filter(metadata, filter)]
+            for vector_id in targets:
+                self._vectors.pop(vector_id, None)
+                self._metadata.pop(vector_id, None)
+        return {}
+    
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return SimpleNamespace(total_vector_count=len(self._vectors))
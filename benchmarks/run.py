@@ -0,0 +1,293 @@
+# benchmarks/run.py
+"""
+Offline benchmark for the RAG pipeline.
+
+Runs RAGSystem.process_questions and the /hackrx/run endpoint against local
+fakes for OpenAI and Pinecone and a synthetic PDF corpus, and reports
+p50/p95/p99 latency, throughput, per-stage timings and peak RSS.
+
+    python -m benchmarks.run --pages 10,100 --questions 5,20 --concurrency 1,8
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from itertools import product
+from typing import List, Dict, Any, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import CorpusServer, generate_questions
+from benchmarks.fakes import FakeOpenAI, FakePineconeIndex, LatencyModel
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS; only the peak is available here
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+class PeakRss:
+    """Sample RSS in a background thread and report the peak above the starting level"""
+    
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+    
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            time.sleep(self.interval)
+    
+    def __enter__(self) -> "PeakRss":
+        self.start = self.peak = current_rss_bytes()
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+    
+    @property
+    def delta_mb(self) -> float:
+        return (self.peak - self.start) / (1024 * 1024)
+
+def configure_environment(args, workdir: str, concurrency: int):
+    """Settings RAGSystem reads from the environment at construction time"""
+    os.environ["QUESTION_CONCURRENCY"] = str(concurrency)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["VECTOR_STORE"] = "local"
+    os.environ["LOCAL_INDEX_DIR"] = os.path.join(workdir, "vectors")
+    os.environ["CHUNK_STORE_DIR"] = os.path.join(workdir, "chunks")
+    if args.warm_caches:
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite3")
+        os.environ["DOCUMENT_CACHE_DIR"] = os.path.join(workdir, "documents")
+        os.environ["DOCUMENT_REGISTRY_PATH"] = os.path.join(workdir, "registry.sqlite3")
+    else:
+        os.environ["EMBEDDING_CACHE_PATH"] = ""
+        os.environ["DOCUMENT_CACHE_DIR"] = ""
+        os.environ["DOCUMENT_REGISTRY_PATH"] = ""
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+def build_fakes(args, seed: int):
+    client = FakeOpenAI(
+        embedding_latency=LatencyModel(args.embed_latency_ms, args.embed_per_item_ms, args.jitter, args.error_rate, seed),
+        chat_latency=LatencyModel(args.chat_latency_ms, args.chat_per_token_ms, args.jitter, args.error_rate, seed + 1),
+        answer_tokens=args.answer_tokens
+    )
+    index = FakePineconeIndex(LatencyModel(args.index_latency_ms, args.index_per_item_ms, args.jitter, args.error_rate, seed + 2))
+    return client, index
+
+def build_rag(args, seed: int):
+    from app.core import RAGSystem
+    from app.vector_store import PineconeVectorStore
+    
+    client, index = build_fakes(args, seed)
+    store = PineconeVectorStore(api_key=None, index_name="benchmark", dimension=1536, index=index)
+    return RAGSystem(client=client, vector_store=store)
+
+def merge_timings(target: Dict[str, List[float]], timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        target.setdefault(stage, []).append(seconds)
+
+def bench_process_questions(args, url: str, questions: List[str], iterations: int) -> Dict[str, Any]:
+    """Cold ingest followed by answering all questions, on a fresh RAGSystem per iteration"""
+    from app.metrics import start_request_timings
+    
+    latencies, ingest_latencies, answer_latencies = [], [], []
+    stages: Dict[str, List[float]] = {}
+    ingest_rss, answer_rss = [], []
+    
+    for iteration in range(iterations):
+        rag = build_rag(args, seed=iteration)
+        timings = start_request_timings()
+        
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            rag.process_document(url)
+            ingest_elapsed = time.perf_counter() - start
+        ingest_rss.append(rss.delta_mb)
+        
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            rag.process_questions(url, questions)
+            answer_elapsed = time.perf_counter() - start
+        answer_rss.append(rss.delta_mb)
+        
+        ingest_latencies.append(ingest_elapsed)
+        answer_latencies.append(answer_elapsed)
+        latencies.append(ingest_elapsed + answer_elapsed)
+        merge_timings(stages, timings)
+    
+    total_time = sum(latencies)
+    return {
+        "latencies": latencies,
+        "phases": {"ingest": ingest_latencies, "answer": answer_latencies},
+        "stages": stages,
+        "throughput_qps": len(questions) * iterations / total_time if total_time else 0.0,
+        "peak_rss_mb": {"ingest": max(ingest_rss), "answer": max(answer_rss)},
+    }
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    timings = {}
+    for part in filter(None, (item.strip() for item in header.split(","))):
+        name, _, duration = part.partition(";dur=")
+        if duration:
+            timings[name] = float(duration) / 1000.0
+    return timings
+
+def bench_endpoint(args, url: str, questions: List[str], iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Concurrent /hackrx/run requests for the same document against a fresh RAGSystem per iteration"""
+    import httpx
+    from app import api
+    
+    token = os.environ.setdefault("HACKATHON_BEARER_TOKEN", "benchmark-token")
+    headers = {"Authorization": f"Bearer {token}", "X-Timing": "1"}
+    payload = {"documents": url, "questions": questions}
+    
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    peak_rss = []
+    wall_total = 0.0
+    
+    async def one_request(client) -> float:
+        start = time.perf_counter()
+        response = await client.post("/hackrx/run", json=payload, headers=headers)
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        merge_timings(stages, parse_server_timing(response.headers.get("server-timing", "")))
+        return elapsed
+    
+    async def run_batch() -> List[float]:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            return await asyncio.gather(*(one_request(client) for _ in range(concurrency)))
+    
+    for iteration in range(iterations):
+        api.rag_system = build_rag(args, seed=iteration)
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            latencies.extend(asyncio.run(run_batch()))
+            wall_total += time.perf_counter() - start
+        peak_rss.append(rss.delta_mb)
+        api.rag_system.close()
+    
+    return {
+        "latencies": latencies,
+        "phases": {},
+        "stages": stages,
+        "throughput_qps": len(questions) * concurrency * iterations / wall_total if wall_total else 0.0,
+        "peak_rss_mb": {"request": max(peak_rss)},
+    }
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+def print_result(result: Dict[str, Any]):
+    config = result["config"]
+    latency = result["latency"]
+    rss = ", ".join(f"{phase} {mb:.1f}MB" for phase, mb in result["peak_rss_mb"].items())
+    print(
+        f"{config['mode']:<9} pages={config['pages']:<5} questions={config['questions']:<4} "
+        f"concurrency={config['concurrency']:<3} p50={latency['p50_ms']:9.1f}ms p95={latency['p95_ms']:9.1f}ms "
+        f"p99={latency['p99_ms']:9.1f}ms  {result['throughput_qps']:8.2f} q/s  peak RSS: {rss}"
+    )
+    for phase, summary in result["phases"].items():
+        print(f"    phase {phase:<14} p50={summary['p50_ms']:9.1f}ms p95={summary['p95_ms']:9.1f}ms p99={summary['p99_ms']:9.1f}ms")
+    for stage, summary in sorted(result["stages"].items()):
+        print(f"    stage {stage:<14} p50={summary['p50_ms']:9.1f}ms p95={summary['p95_ms']:9.1f}ms p99={summary['p99_ms']:9.1f}ms")
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for the RAG pipeline")
+    parser.add_argument("--mode", choices=["process", "endpoint", "both"], default="both")
+    parser.add_argument("--pages", type=int_list, default=[10, 50], help="comma-separated document sizes in pages")
+    parser.add_argument("--questions", type=int_list, default=[5, 20], help="comma-separated questions per request")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8],
+                        help="question workers (process mode) / concurrent requests (endpoint mode)")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--embed-latency-ms", type=float, default=80.0)
+    parser.add_argument("--embed-per-item-ms", type=float, default=0.5)
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0)
+    parser.add_argument("--chat-per-token-ms", type=float, default=4.0)
+    parser.add_argument("--index-latency-ms", type=float, default=25.0)
+    parser.add_argument("--index-per-item-ms", type=float, default=0.05)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative +/- latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability each upstream call fails")
+    parser.add_argument("--warm-caches", action="store_true", help="keep embedding/answer caches enabled")
+    parser.add_argument("--json", dest="json_path", help="also write results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own progress output")
+    args = parser.parse_args(argv)
+    
+    modes = ["process", "endpoint"] if args.mode == "both" else [args.mode]
+    results = []
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_dir = os.path.join(workdir, "corpus")
+        os.makedirs(corpus_dir)
+        
+        with CorpusServer(corpus_dir) as server:
+            documents = {}
+            for pages in args.pages:
+                url, size = server.add_document(f"policy_{pages}p.pdf", pages, seed=pages)
+                documents[pages] = url
+                print(f"Generated {pages}-page document ({size / 1024:.0f} KB)")
+            
+            for mode, pages, question_count, concurrency in product(modes, args.pages, args.questions, args.concurrency):
+                configure_environment(args, os.path.join(workdir, f"run_{len(results)}"), concurrency)
+                questions = generate_questions(question_count, seed=question_count)
+                
+                quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+                with quiet:
+                    if mode == "process":
+                        raw = bench_process_questions(args, documents[pages], questions, args.iterations)
+                    else:
+                        raw = bench_endpoint(args, documents[pages], questions, args.iterations, concurrency)
+                
+                result = {
+                    "config": {"mode": mode, "pages": pages, "questions": question_count, "concurrency": concurrency},
+                    "latency": summarize(raw["latencies"]),
+                    "phases": {phase: summarize(values) for phase, values in raw["phases"].items()},
+                    "stages": {stage: summarize(values) for stage, values in raw["stages"].items()},
+                    "throughput_qps": raw["throughput_qps"],
+                    "peak_rss_mb": raw["peak_rss_mb"],
+                }
+                results.append(result)
+                print_result(result)
+    
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
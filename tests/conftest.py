@@ -0,0 +1,78 @@
+# tests/conftest.py
+import itertools
+import os
+import time
+import pytest
+from benchmarks.corpus import CorpusServer, build_pdf
+from benchmarks.fakes import FakeOpenAI, FakePineconeIndex
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Point every on-disk store at a fresh directory and keep the pipeline deterministic"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("VECTOR_STORE", "local")
+    monkeypatch.setenv("LOCAL_INDEX_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setenv("CHUNK_STORE_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setenv("DOCUMENT_CACHE_DIR", str(tmp_path / "documents"))
+    monkeypatch.setenv("DOCUMENT_REGISTRY_PATH", str(tmp_path / "registry.sqlite3"))
+    monkeypatch.setenv("DOCUMENT_REVALIDATE_SECONDS", "0")
+    monkeypatch.setenv("QUESTION_CONCURRENCY", "1")
+    monkeypatch.setenv("PDF_EXTRACT_WORKERS", "1")
+    return tmp_path
+
+@pytest.fixture
+def corpus(tmp_path):
+    served = tmp_path / "www"
+    served.mkdir()
+    with CorpusServer(str(served)) as server:
+        yield server
+
+@pytest.fixture
+def serve(corpus):
+    """Serve pages (lists of lines) as a PDF under a name and return its URL; call again to change it"""
+    versions = itertools.count()
+    
+    def write(name: str, pages) -> str:
+        path = f"{corpus.directory}/{name}"
+        with open(path, "wb") as f:
+            f.write(build_pdf(pages))
+        # Last-Modified has one-second resolution: step it so a rewrite is never revalidated as unchanged
+        stamp = time.time() + 10 * next(versions)
+        os.utime(path, (stamp, stamp))
+        return f"{corpus.url}/{name}"
+    return write
+
+class CountingEmbeddings:
+    """Wraps the fake embeddings endpoint, recording every text sent to it"""
+    
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.texts = []
+        self.fail = None
+    
+    def create(self, model, input, **kwargs):
+        if self.fail is not None:
+            raise self.fail
+        self.texts.extend([input] if isinstance(input, str) else input)
+        return self.embeddings.create(model=model, input=input, **kwargs)
+
+@pytest.fixture
+def make_rag(workdir):
+    """Build RAGSystems on the fake OpenAI client and Pinecone index; closed after the test"""
+    from app.core import RAGSystem
+    from app.vector_store import PineconeVectorStore
+    
+    created = []
+    
+    def make(index=None):
+        client = FakeOpenAI()
+        client.embeddings = CountingEmbeddings(client.embeddings)
+        store = PineconeVectorStore(api_key=None, index_name="test", dimension=1536, index=index or FakePineconeIndex())
+        rag = RAGSystem(client=client, vector_store=store)
+        created.append(rag)
+        return rag
+    
+    yield make
+    for rag in created:
+        rag.close()
@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from app.answer_cache import AnswerCache
+from app.models import QueryResult
+
+SCOPE = ("content-hash", "prompt-v1")
+
+def result(answer):
+    return QueryResult(answer=answer, confidence=1.0, source_chunks=[])
+
+def vector(seed, dimension=16):
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+def near(base, seed):
+    return base + 0.01 * vector(seed, len(base))
+
+def test_near_duplicate_question_is_found_within_its_scope():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("a", result("A"), SCOPE, vector(1))
+    cache.put("b", result("B"), SCOPE, vector(2))
+    
+    assert cache.find_similar(SCOPE, near(vector(2), 9)).answer == "B"
+    assert cache.find_similar(("other-hash", "prompt-v1"), vector(2)) is None
+    assert cache.find_similar(SCOPE, vector(3)) is None
+
+def test_evicted_entries_are_no_longer_found():
+    cache = AnswerCache(max_entries=3, similarity_threshold=0.95)
+    for seed in range(10):
+        cache.put(f"q{seed}", result(f"A{seed}"), SCOPE, vector(seed))
+    
+    for seed in range(7):
+        assert cache.find_similar(SCOPE, vector(seed)) is None
+    for seed in range(7, 10):
+        assert cache.find_similar(SCOPE, vector(seed)).answer == f"A{seed}"
+    assert len(cache._vectors[SCOPE]) == 3
+
+def test_replacing_and_expiring_entries_keeps_vectors_in_step():
+    cache = AnswerCache(ttl_seconds=60, similarity_threshold=0.95)
+    cache.put("a", result("old"), SCOPE, vector(1))
+    cache.put("a", result("new"), SCOPE, vector(2))
+    assert cache.find_similar(SCOPE, vector(1)) is None
+    assert cache.find_similar(SCOPE, vector(2)).answer == "new"
+    
+    cache._entries["a"].expires_at = time.time() - 1
+    assert cache.find_similar(SCOPE, vector(2)) is None
+    assert SCOPE not in cache._vectors
+
+def test_lookups_stay_correct_after_removals_from_the_middle():
+    cache = AnswerCache(similarity_threshold=0.95)
+    for seed in range(40):
+        cache.put(f"q{seed}", result(f"A{seed}"), SCOPE, vector(seed))
+    for seed in range(0, 40, 3):
+        cache._remove(f"q{seed}")
+    
+    for seed in range(40):
+        found = cache.find_similar(SCOPE, vector(seed))
+        if seed % 3 == 0:
+            assert found is None
+        else:
+            assert found.answer == f"A{seed}"
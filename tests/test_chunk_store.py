@@ -0,0 +1,50 @@
+import os
+import pytest
+from app import chunk_store
+from app.chunk_store import ChunkStore, ZLIB
+
+TEXTS = ["Grace period of thirty days.", "", "Déductible: ₹5,000 per claim.", "x" * 10000]
+
+def write(store, doc_id, content_hash, texts):
+    writer = store.writer(doc_id, content_hash)
+    for text in texts:
+        writer.append(text)
+    writer.commit()
+
+@pytest.mark.parametrize("zstd", [True, False])
+def test_round_trip(tmp_path, monkeypatch, zstd):
+    if not zstd:
+        monkeypatch.setattr(chunk_store, "_zstandard", lambda: None)
+    store = ChunkStore(str(tmp_path))
+    write(store, "doc", "v1", TEXTS)
+    
+    assert list(store.iter_texts("doc", "v1")) == TEXTS
+    assert store.get("doc", "v1", [3, 0, 7, -1]) == [TEXTS[3], TEXTS[0], None, None]
+    if not zstd:
+        assert store._reader("doc", "v1").codec == ZLIB
+
+def test_missing_version_reads_as_empty(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    assert store.get("doc", "v1", [0, 1]) == [None, None]
+    assert list(store.iter_texts("doc", "v1")) == []
+
+def test_aborted_writer_leaves_nothing_behind(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    writer = store.writer("doc", "v1")
+    writer.append("partial")
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+    assert store.get("doc", "v1", [0]) == [None]
+
+def test_remove_versions_keeps_only_the_current_version(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    write(store, "doc", "v1", ["old"])
+    write(store, "doc", "v2", ["new"])
+    write(store, "other", "v1", ["unrelated"])
+    assert store.get("doc", "v1", [0]) == ["old"]
+    
+    store.remove_versions("doc", keep="v2")
+    assert store.get("doc", "v1", [0]) == [None]
+    assert store.get("doc", "v2", [0]) == ["new"]
+    assert store.get("other", "v1", [0]) == ["unrelated"]
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,62 @@
+# tests/test_chunking.py
+import pytest
+from benchmarks.corpus import generate_pages
+from app.chunking import TokenChunker, RegexTokenizer, normalize_whitespace, get_tokenizer
+
+PAGES = ["\n".join(lines) for lines in generate_pages(6)]
+
+@pytest.fixture(params=["regex", "model"])
+def chunker(request):
+    tokenizer = RegexTokenizer() if request.param == "regex" else get_tokenizer("text-embedding-3-small")
+    return TokenChunker(max_tokens=120, overlap_tokens=20, tokenizer=tokenizer)
+
+def check_spans(chunker, text, spans):
+    assert spans
+    for span in spans:
+        chunk = text[span.start:span.end]
+        assert chunk == chunk.strip() and chunk
+        assert span.token_count <= chunker.max_tokens
+    
+    for previous, span in zip(spans, spans[1:]):
+        assert previous.start < span.start
+        assert previous.end < span.end
+        # Consecutive chunks overlap or touch, so no text falls between them
+        assert not text[previous.end:span.start].strip()
+    
+    stripped = text.strip()
+    assert spans[0].start == text.index(stripped[0])
+    assert spans[-1].end == len(text.rstrip())
+
+def test_chunk_spans_cover_text_in_order(chunker):
+    text = "\n\n".join(PAGES)
+    check_spans(chunker, text, chunker.chunk(text))
+
+def test_streamed_pages_match_the_joined_document(chunker):
+    document = "\n".join(normalize_whitespace(page) for page in PAGES)
+    streamed = list(chunker.iter_chunks(PAGES))
+    
+    assert [span for span, _ in streamed] == chunker.chunk(document)
+    for span, chunk in streamed:
+        assert document[span.start:span.end] == chunk
+    check_spans(chunker, document, [span for span, _ in streamed])
+
+def test_consecutive_chunks_overlap(chunker):
+    text = "\n\n".join(PAGES)
+    spans = chunker.chunk(text)
+    overlapping = sum(1 for previous, span in zip(spans, spans[1:]) if span.start < previous.end)
+    assert overlapping >= len(spans) // 2
+
+def test_chunks_prefer_sentence_ends():
+    chunker = TokenChunker(max_tokens=40, overlap_tokens=0)
+    text = " ".join(f"Sentence number {i} describes clause {i} of the policy." for i in range(60))
+    for span in chunker.chunk(text)[:-1]:
+        assert text[span.start:span.end].endswith(".")
+
+def test_empty_and_blank_pages_produce_no_chunks():
+    chunker = TokenChunker(max_tokens=40, overlap_tokens=5)
+    assert chunker.chunk("") == []
+    assert list(chunker.iter_chunks(["", "  \n ", ""])) == []
+
+def test_overlap_must_be_smaller_than_budget():
+    with pytest.raises(ValueError):
+        TokenChunker(max_tokens=10, overlap_tokens=10)
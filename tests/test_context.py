@@ -0,0 +1,44 @@
+from app.context import pack_context
+from app.models import VectorMatch
+
+def words(text):
+    return len(text.split())
+
+def match(text, **metadata):
+    return VectorMatch(id=text[:12], score=1.0, metadata={'text': text, **metadata})
+
+DOCUMENT = "The grace period is thirty days. Premiums may be paid monthly. Claims are settled within fifteen days."
+
+def span(start, end, **metadata):
+    return match(DOCUMENT[start:end], start=start, end=end, **metadata)
+
+def test_overlapping_spans_are_merged_once():
+    passages = pack_context([span(33, 70), span(0, 45)], 100, words)
+    assert passages == [DOCUMENT[0:70]]
+
+def test_adjacent_spans_are_joined_and_distant_ones_kept_apart():
+    first, second, far = span(0, 32), span(33, 62), span(63, 101)
+    assert pack_context([first, second], 100, words) == [DOCUMENT[0:62]]
+    assert pack_context([first, far], 100, words) == [DOCUMENT[0:32], DOCUMENT[63:101]]
+
+def test_consecutive_chunks_without_offsets_drop_shared_text():
+    passages = pack_context([
+        match("premiums may be paid monthly or yearly", chunk_index=4),
+        match("the grace period is thirty days and premiums may be paid", chunk_index=3),
+    ], 100, words)
+    assert passages == ["the grace period is thirty days and premiums may be paid monthly or yearly"]
+
+def test_passages_are_ordered_by_best_rank_and_duplicates_dropped():
+    passages = pack_context([span(63, 101), match("unrelated note"), span(0, 32), span(63, 101)], 100, words)
+    assert passages == [DOCUMENT[63:101], "unrelated note", DOCUMENT[0:32]]
+
+def test_budget_skips_passages_that_do_not_fit():
+    passages = pack_context([span(0, 32), span(63, 101), match("short")], 8, words)
+    assert passages == [DOCUMENT[0:32], "short"]
+
+def test_best_passage_is_truncated_when_nothing_fits():
+    text = " ".join(f"word{i}" for i in range(50))
+    passages = pack_context([match(text), match("short")], 10, words)
+    assert len(passages) == 1
+    assert words(passages[0]) <= 10
+    assert text.startswith(passages[0])
@@ -0,0 +1,39 @@
+import pytest
+
+class Rejected(Exception):
+    status_code = 400
+
+class RejectingEmbeddings:
+    """Rejects any request containing a poisoned input, like an API refusing one bad text"""
+    
+    def __init__(self, embeddings, poisoned):
+        self.embeddings = embeddings
+        self.poisoned = poisoned
+        self.requests = 0
+    
+    def create(self, model, input, **kwargs):
+        self.requests += 1
+        if any(text in self.poisoned for text in input):
+            raise Rejected("invalid input")
+        return self.embeddings.create(model=model, input=input, **kwargs)
+
+@pytest.mark.parametrize("bad", [[0], [77], [5, 127]])
+def test_rejected_batches_are_bisected_down_to_the_bad_inputs(make_rag, bad):
+    rag = make_rag()
+    texts = [f"clause {i} of the policy" for i in range(128)]
+    rag.client.embeddings = RejectingEmbeddings(rag.client.embeddings.embeddings, {texts[i] for i in bad})
+    
+    _, fresh, unavailable = rag._request_embeddings(texts)
+    assert [i for i, ok in enumerate(fresh) if not ok] == bad
+    assert not any(unavailable)
+    # About log2(128) levels of splitting per bad input
+    assert rag.client.embeddings.requests <= 1 + 2 * 7 * len(bad)
+
+def test_transient_failures_are_not_bisected(make_rag, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_MAX_RETRIES", "0")
+    rag = make_rag()
+    rag.client.embeddings.fail = ConnectionError("reset")
+    
+    _, fresh, unavailable = rag._request_embeddings(["a", "b", "c", "d"])
+    assert not any(fresh)
+    assert all(unavailable)
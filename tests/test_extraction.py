@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from benchmarks.corpus import build_pdf, generate_pages
+from app.utils import iter_pdf_pages
+
+class BreakingPool:
+    """Process pool stand-in whose workers die after a number of page ranges"""
+    
+    def __init__(self, completed: int):
+        self.completed = completed
+        self.submitted = 0
+        self.shut_down = False
+    
+    def submit(self, fn, *args):
+        future = Future()
+        if self.submitted < self.completed:
+            future.set_result(fn(*args))
+        else:
+            future.set_exception(BrokenProcessPool("a worker process terminated abruptly"))
+        self.submitted += 1
+        return future
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "policy.pdf"
+    path.write_bytes(build_pdf(generate_pages(10)))
+    return str(path)
+
+@pytest.mark.parametrize("completed", [0, 3])
+def test_broken_extraction_pool_falls_back_in_process(make_rag, pdf_path, completed):
+    rag = make_rag()
+    rag.extract_workers = 2
+    rag.extract_parallel_min_pages = 1
+    pool = BreakingPool(completed)
+    rag._extract_executor = pool
+    
+    assert list(rag._iter_pages(pdf_path)) == list(iter_pdf_pages(pdf_path))
+    assert pool.shut_down
+    assert rag._extract_executor is None
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import httpx
+import pytest
+from app.fetcher import DocumentFetcher
+from app.utils import create_document_id
+
+BODY = bytes(range(256)) * 64
+
+class Origin:
+    """HTTP origin with ETag revalidation and byte-range support, recording request headers"""
+    
+    def __init__(self, body: bytes = BODY, etag: str = '"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+    
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.headers)
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers={"etag": self.etag})
+        headers = {"etag": self.etag}
+        range_header = request.headers.get("range")
+        if range_header and request.headers.get("if-range") == self.etag:
+            start = int(range_header[len("bytes="):-1])
+            headers["content-range"] = f"bytes {start}-{len(self.body) - 1}/{len(self.body)}"
+            return httpx.Response(206, headers=headers, content=self.body[start:])
+        return httpx.Response(200, headers=headers, content=self.body)
+
+@pytest.fixture
+def make_fetcher(tmp_path):
+    created = []
+    
+    def make(origin, **kwargs):
+        fetcher = DocumentFetcher(cache_dir=str(tmp_path / "cache"), **kwargs)
+        fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(origin))
+        created.append(fetcher)
+        return fetcher
+    
+    yield make
+    for fetcher in created:
+        fetcher.close()
+
+def test_cached_document_is_revalidated(make_fetcher):
+    origin = Origin()
+    fetcher = make_fetcher(origin)
+    url = "http://origin/policy.pdf"
+    
+    first = fetcher.fetch(url)
+    assert not first.not_modified
+    assert first.content_hash == hashlib.sha256(BODY).hexdigest()
+    fetcher.release(first)
+    
+    second = fetcher.fetch(url)
+    assert second.not_modified
+    assert second.path == first.path and second.content_hash == first.content_hash
+    assert origin.requests[1]["if-none-match"] == '"v1"'
+    fetcher.release(second)
+
+def test_changed_document_is_downloaded_again(make_fetcher):
+    origin = Origin()
+    fetcher = make_fetcher(origin)
+    url = "http://origin/policy.pdf"
+    fetcher.release(fetcher.fetch(url))
+    
+    origin.body, origin.etag = BODY[::-1], '"v2"'
+    document = fetcher.fetch(url)
+    assert not document.not_modified
+    assert document.content_hash == hashlib.sha256(BODY[::-1]).hexdigest()
+    with open(document.path, "rb") as f:
+        assert f.read() == BODY[::-1]
+
+def interrupted_download(fetcher, url, received: bytes, etag: str):
+    """Leave a partial body behind as an interrupted download would"""
+    _, _, part_path, part_meta_path = fetcher._paths(create_document_id(url))
+    with open(part_path, "wb") as f:
+        f.write(received)
+    with open(part_meta_path, "w") as f:
+        json.dump({"url": url, "etag": etag, "last_modified": None}, f)
+
+def test_interrupted_download_resumes_with_range(make_fetcher):
+    origin = Origin()
+    fetcher = make_fetcher(origin)
+    url = "http://origin/policy.pdf"
+    interrupted_download(fetcher, url, BODY[:5000], '"v1"')
+    
+    document = fetcher.fetch(url)
+    assert origin.requests[0]["range"] == "bytes=5000-"
+    assert origin.requests[0]["if-range"] == '"v1"'
+    assert document.content_hash == hashlib.sha256(BODY).hexdigest()
+    assert document.size == len(BODY)
+
+def test_resume_restarts_when_the_document_changed(make_fetcher):
+    origin = Origin(etag='"v2"')
+    fetcher = make_fetcher(origin)
+    url = "http://origin/policy.pdf"
+    interrupted_download(fetcher, url, b"stale bytes", '"v1"')
+    
+    document = fetcher.fetch(url)
+    assert document.content_hash == hashlib.sha256(BODY).hexdigest()
+    with open(document.path, "rb") as f:
+        assert f.read() == BODY
+
+def test_documents_in_use_are_not_evicted(make_fetcher):
+    fetcher = make_fetcher(Origin(), cache_max_bytes=len(BODY))
+    
+    in_use = fetcher.fetch("http://origin/a.pdf")
+    other = fetcher.fetch("http://origin/b.pdf")
+    assert os.path.exists(in_use.path) and os.path.exists(other.path)
+    fetcher.release(other)
+    fetcher.release(in_use)
+    
+    # Once released, the least recently used body goes; a metadata file already gone is tolerated
+    os.remove(in_use.path[:-4] + ".json")
+    latest = fetcher.fetch("http://origin/c.pdf")
+    assert not os.path.exists(in_use.path)
+    assert os.path.exists(latest.path)
+
+def test_temporary_documents_are_deleted_on_release(tmp_path):
+    fetcher = DocumentFetcher(cache_dir="")
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(Origin()))
+    try:
+        document = fetcher.fetch("http://origin/policy.pdf")
+        assert document.temporary and os.path.exists(document.path)
+        fetcher.release(document)
+        assert not os.path.exists(document.path)
+    finally:
+        fetcher.close()
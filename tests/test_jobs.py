@@ -0,0 +1,49 @@
+import threading
+import time
+import pytest
+from app.jobs import IngestQueue, IngestQueueFull, SUCCEEDED, CANCELLED
+
+def make_queue(ingest, workers=1, max_queued=10):
+    return IngestQueue(ingest=ingest, document_id=lambda url: url.rsplit("/", 1)[-1],
+                       chunks_count=lambda doc_id: 3, workers=workers, max_queued=max_queued)
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def test_jobs_for_the_same_document_are_collapsed():
+    release = threading.Event()
+    jobs = make_queue(lambda url: release.wait(5))
+    first = jobs.submit("http://origin/a.pdf")
+    assert jobs.submit("http://origin/a.pdf") is first
+    release.set()
+    wait_until(lambda: not first.active)
+    jobs.close()
+    assert first.status == SUCCEEDED and first.chunks_count == 3
+
+def test_close_cancels_queued_jobs_and_waits_for_running_ones():
+    started, release = threading.Event(), threading.Event()
+    
+    def ingest(url):
+        started.set()
+        return release.wait(5)
+    
+    jobs = make_queue(ingest)
+    running = jobs.submit("http://origin/a.pdf")
+    started.wait(5)
+    queued = [jobs.submit(f"http://origin/{name}.pdf") for name in "bcd"]
+    
+    closer = threading.Thread(target=jobs.close)
+    closer.start()
+    wait_until(lambda: all(job.status == CANCELLED for job in queued))
+    assert closer.is_alive(), "close() should wait for the running job"
+    with pytest.raises(IngestQueueFull):
+        jobs.submit("http://origin/e.pdf")
+    
+    release.set()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert running.status == SUCCEEDED
+    assert jobs.stats()["cancelled"] == 3
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from app.quantization import quantize_int8, dequantize_int8, int8_scores, binarize, hamming_distances
+from app.vector_store import LocalVectorStore
+
+DIMENSION = 64
+
+def unit_rows(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def test_int8_scores_match_dequantized_product_across_blocks():
+    rows, queries = unit_rows(1000), unit_rows(3, seed=1)
+    codes, scales = quantize_int8(rows)
+    expected = queries @ dequantize_int8(codes, scales).T
+    np.testing.assert_allclose(int8_scores(codes, scales, queries, block=128), expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(expected, queries @ rows.T, atol=0.02)
+
+def test_hamming_distances_count_differing_sign_bits():
+    rows = unit_rows(5)
+    flipped = rows.copy()
+    flipped[:, :3] *= -1
+    assert (hamming_distances(binarize(rows), binarize(flipped)).diagonal() == 3).all()
+    assert (hamming_distances(binarize(rows), binarize(rows)).diagonal() == 0).all()
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_shortlist_and_rescore_returns_exact_scores(tmp_path, quantization):
+    rows = unit_rows(500)
+    store = LocalVectorStore(str(tmp_path), DIMENSION, quantization=quantization)
+    store.upsert([{'id': f"c{i}", 'values': row, 'metadata': {'doc_id': "doc"}} for i, row in enumerate(rows)])
+    store.flush()
+    
+    # Each query is a slightly perturbed stored row, which must come back first with its exact cosine
+    targets = [3, 141, 499]
+    noise = 0.05 * unit_rows(len(targets), seed=2)
+    queries = rows[targets] + noise
+    results = store.query_many(queries, top_k=5, doc_id="doc")
+    
+    unit_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    for target, query, matches in zip(targets, unit_queries, results):
+        assert matches[0].id == f"c{target}"
+        exact = rows @ query
+        for match in matches:
+            assert match.score == pytest.approx(float(exact[int(match.id[1:])]), abs=1e-5)
+        assert [match.score for match in matches] == sorted((match.score for match in matches), reverse=True)
+    assert store._documents["doc"].codes is not None
+
+def test_small_documents_are_scored_exactly(tmp_path):
+    rows = unit_rows(10)
+    store = LocalVectorStore(str(tmp_path), DIMENSION, quantization="int8")
+    store.upsert([{'id': f"c{i}", 'values': row, 'metadata': {'doc_id': "doc"}} for i, row in enumerate(rows)])
+    
+    matches = store.query(rows[4], top_k=3, doc_id="doc")
+    assert matches[0].id == "c4"
+    assert matches[0].score == pytest.approx(1.0, abs=1e-5)
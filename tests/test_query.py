@@ -0,0 +1,79 @@
+import pytest
+from benchmarks.corpus import generate_pages
+from app.utils import create_document_id
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "What is the waiting period for pre-existing diseases?",
+    "Does the policy cover maternity expenses?",
+]
+
+class RecordingChat:
+    """Wraps the fake chat endpoint, recording the response_format of every call"""
+    
+    def __init__(self, completions):
+        self.completions = completions
+        self.formats = []
+    
+    def create(self, **kwargs):
+        self.formats.append((kwargs.get("response_format") or {}).get("type"))
+        return self.completions.create(**kwargs)
+
+@pytest.fixture
+def indexed(make_rag, serve, monkeypatch):
+    """A RAG system with one document indexed; returns (rag, doc_id)"""
+    def build(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        url = serve("policy.pdf", generate_pages(4))
+        rag = make_rag()
+        assert rag.process_document(url)
+        return rag, create_document_id(url)
+    return build
+
+def test_combined_generation_answers_each_question(indexed):
+    rag, doc_id = indexed(COMBINED_GENERATION_SIZE="4", ANSWER_CACHE_MAX_ENTRIES="0")
+    rag.client.chat.completions = RecordingChat(rag.client.chat.completions)
+    
+    results = rag.query_documents(QUESTIONS, doc_id=doc_id)
+    # Questions sharing chunks were answered by one structured call, with no per-question fallback
+    formats = rag.client.chat.completions.formats
+    assert formats.count("json_schema") == 1
+    assert len(formats) < len(QUESTIONS)
+    for question, result in zip(QUESTIONS, results):
+        assert result.answer.startswith(f"Answer to '{question}'")
+
+def test_failed_batched_search_only_fails_the_questions_that_still_fail(indexed):
+    rag, doc_id = indexed(ANSWER_CACHE_MAX_ENTRIES="0")
+    store = rag.vector_store
+    query = store.query
+    calls = []
+    
+    def broken_query_many(*args, **kwargs):
+        raise ConnectionError("batched search unavailable")
+    
+    def flaky_query(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise ConnectionError("search unavailable")
+        return query(*args, **kwargs)
+    
+    store.query_many = broken_query_many
+    store.query = flaky_query
+    results = rag.query_documents(QUESTIONS, doc_id=doc_id)
+    
+    assert results[1].answer.startswith("Error processing query")
+    assert results[1].confidence == 0.0
+    for index in (0, 2):
+        assert results[index].answer.startswith(f"Answer to '{QUESTIONS[index]}'")
+
+def test_failed_question_embedding_answers_questions_one_by_one(indexed):
+    rag, doc_id = indexed(ANSWER_CACHE_MAX_ENTRIES="0")
+    
+    def broken_embeddings(texts):
+        raise ConnectionError("embeddings unavailable")
+    
+    rag.get_embeddings = broken_embeddings
+    results = rag.query_documents(QUESTIONS, doc_id=doc_id)
+    for question, result in zip(QUESTIONS, results):
+        assert result.answer.startswith(f"Answer to '{question}'")
@@ -0,0 +1,66 @@
+# tests/test_registry.py
+import threading
+import time
+import pytest
+from app.registry import DocumentRegistry
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "registry.sqlite3")
+
+def test_records_are_shared_and_reloaded(path):
+    first, second = DocumentRegistry(path), DocumentRegistry(path)
+    first["doc"] = {"content_hash": "a"}
+    assert second["doc"] == {"content_hash": "a"}
+    
+    first["doc"] = {"content_hash": "b"}
+    assert second["doc"] == {"content_hash": "b"}
+    
+    del second["doc"]
+    assert "doc" not in first
+    assert len(first) == 0
+
+def test_lock_excludes_other_owners_until_released(path):
+    first, second = DocumentRegistry(path), DocumentRegistry(path)
+    with first.ingest_lock("doc"):
+        assert not second._try_lock("doc")
+        assert first.ingesting() == ["doc"]
+    assert first.ingesting() == []
+    assert second._try_lock("doc")
+
+def test_lock_expires_after_ttl_when_owner_stops_renewing(path):
+    crashed = DocumentRegistry(path, lock_ttl=0.2)
+    other = DocumentRegistry(path, lock_ttl=0.2)
+    assert crashed._try_lock("doc")
+    assert not other._try_lock("doc")
+    
+    time.sleep(0.3)
+    assert other._try_lock("doc")
+    assert not crashed._try_lock("doc")
+
+def test_held_lock_is_renewed_past_its_ttl(path):
+    holder = DocumentRegistry(path, lock_ttl=0.3)
+    other = DocumentRegistry(path, lock_ttl=0.3)
+    with holder.ingest_lock("doc"):
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            assert not other._try_lock("doc")
+            time.sleep(0.05)
+    assert other._try_lock("doc")
+
+def test_waiting_owner_gets_lock_after_release(path):
+    holder = DocumentRegistry(path)
+    waiter = DocumentRegistry(path, poll_interval=0.02)
+    order = []
+    
+    def wait():
+        with waiter.ingest_lock("doc"):
+            order.append("waiter")
+    
+    with holder.ingest_lock("doc"):
+        thread = threading.Thread(target=wait)
+        thread.start()
+        time.sleep(0.1)
+        order.append("holder")
+    thread.join(timeout=2)
+    assert order == ["holder", "waiter"]
@@ -0,0 +1,152 @@
+# tests/test_reindex.py
+import time
+from benchmarks.corpus import generate_pages
+from benchmarks.fakes import FakeAPIError
+from app.chunking import ChunkSpan
+from app.utils import create_document_id, hash_chunk
+
+def indexed_ids(rag):
+    return set(rag.vector_store.index._vectors)
+
+def test_unchanged_document_is_not_reembedded(make_rag, serve):
+    url = serve("policy.pdf", generate_pages(6))
+    rag = make_rag()
+    assert rag.process_document(url)
+    embedded = len(rag.client.embeddings.texts)
+    assert embedded > 0
+    
+    assert rag.process_document(url)
+    assert len(rag.client.embeddings.texts) == embedded
+
+def test_unchanged_document_is_skipped_by_a_new_process(make_rag, serve):
+    url = serve("policy.pdf", generate_pages(6))
+    first = make_rag()
+    assert first.process_document(url)
+    
+    second = make_rag(index=first.vector_store.index)
+    assert second.process_document(url)
+    assert second.client.embeddings.texts == []
+
+def test_changed_document_embeds_only_new_chunks_and_drops_stale_ones(make_rag, serve):
+    pages = generate_pages(8)
+    url = serve("policy.pdf", pages)
+    rag = make_rag()
+    assert rag.process_document(url)
+    doc_id = create_document_id(url)
+    before = dict(rag.processed_documents[doc_id]['chunks'])
+    
+    # A new first page shifts every later chunk; the last page is rewritten
+    changed = generate_pages(1, seed=7) + pages[:-1] + generate_pages(1, seed=9)
+    serve("policy.pdf", changed)
+    rag.client.embeddings.texts.clear()
+    assert rag.process_document(url)
+    
+    after = rag.processed_documents[doc_id]['chunks']
+    moved = [chunk_id for chunk_id in after if chunk_id in before and after[chunk_id] != before[chunk_id]]
+    new = [chunk_id for chunk_id in after if chunk_id not in before]
+    assert moved, "chunks after the inserted page should be reused at their new positions"
+    stale = set(before) - set(after)
+    assert stale
+    assert len(rag.client.embeddings.texts) == len(new)
+    assert indexed_ids(rag) == set(after)
+    
+    for chunk_id in moved:
+        assert rag.vector_store.index._metadata[chunk_id]['chunk_index'] == after[chunk_id][0]
+
+def test_repeated_chunk_text_gets_index_suffix(make_rag):
+    rag = make_rag()
+    chunks = [
+        (ChunkSpan(0, 10, 3), "same text"),
+        (ChunkSpan(11, 21, 3), "other text"),
+        (ChunkSpan(22, 32, 3), "same text"),
+    ]
+    manifest, fallback = rag._index_chunks("doc", "hash", iter(chunks), {})
+    
+    base = f"doc_{hash_chunk('same text')}"
+    assert manifest == {
+        base: [0, 0, 10],
+        f"doc_{hash_chunk('other text')}": [1, 11, 21],
+        f"{base}_2": [2, 22, 32],
+    }
+    assert fallback == []
+    assert indexed_ids(rag) == set(manifest)
+
+def test_unchanged_chunks_at_same_position_are_skipped(make_rag):
+    rag = make_rag()
+    chunks = [(ChunkSpan(0, 5, 2), "alpha"), (ChunkSpan(6, 10, 2), "beta")]
+    manifest, _ = rag._index_chunks("doc", "v1", iter(chunks), {})
+    rag.client.embeddings.texts.clear()
+    
+    manifest_again, _ = rag._index_chunks("doc", "v2", iter(chunks), manifest)
+    assert manifest_again == manifest
+    assert rag.client.embeddings.texts == []
+
+class Rejected(Exception):
+    status_code = 400
+
+def wait_for_jobs(rag, timeout=10):
+    deadline = time.time() + timeout
+    while any(job.active for job in rag.ingest_queue.jobs()):
+        assert time.time() < deadline, "ingest jobs did not finish"
+        time.sleep(0.01)
+
+def test_fallback_vectors_are_reembedded_in_the_background(make_rag, serve, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_MAX_RETRIES", "0")
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "1")
+    monkeypatch.setenv("FALLBACK_REEMBED_DELAY", "0")
+    url = serve("policy.pdf", generate_pages(4))
+    doc_id = create_document_id(url)
+    
+    outage = make_rag()
+    outage.client.embeddings.fail = FakeAPIError("provider down")
+    assert outage.process_document(url)
+    record = outage.processed_documents[doc_id]
+    assert set(record['fallback_chunks']) == set(record['chunks'])
+    # The circuit is open, so no re-embedding job is queued
+    assert outage.ingest_queue.jobs() == []
+    
+    healthy = make_rag(index=outage.vector_store.index)
+    assert healthy.process_document(url)
+    wait_for_jobs(healthy)
+    record = healthy.processed_documents[doc_id]
+    assert record['fallback_chunks'] == []
+    assert record['reembed_attempts'] == 1
+    assert sorted(healthy.client.embeddings.texts) == sorted(healthy.chunk_store.iter_texts(doc_id, record['content_hash']))
+    
+    embedded = len(healthy.client.embeddings.texts)
+    assert healthy.process_document(url)
+    wait_for_jobs(healthy)
+    assert len(healthy.client.embeddings.texts) == embedded
+
+def test_rejected_inputs_are_not_reembedded(make_rag, serve, monkeypatch):
+    monkeypatch.setenv("FALLBACK_REEMBED_DELAY", "0")
+    url = serve("policy.pdf", generate_pages(4))
+    doc_id = create_document_id(url)
+    
+    rag = make_rag()
+    rag.client.embeddings.fail = Rejected("invalid input")
+    assert rag.process_document(url)
+    assert rag.processed_documents[doc_id]['fallback_chunks'] == []
+    
+    for _ in range(3):
+        assert rag.process_document(url)
+    assert rag.ingest_queue.jobs() == []
+
+def test_reembedding_attempts_are_bounded(make_rag, serve, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_MAX_RETRIES", "0")
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "1000")
+    monkeypatch.setenv("FALLBACK_REEMBED_DELAY", "0")
+    monkeypatch.setenv("FALLBACK_REEMBED_ATTEMPTS", "2")
+    url = serve("policy.pdf", generate_pages(4))
+    doc_id = create_document_id(url)
+    
+    rag = make_rag()
+    rag.client.embeddings.fail = FakeAPIError("provider down")
+    for _ in range(5):
+        assert rag.process_document(url)
+        wait_for_jobs(rag)
+    
+    record = rag.processed_documents[doc_id]
+    assert set(record['fallback_chunks']) == set(record['chunks'])
+    assert record['reembed_attempts'] == 2
+    assert len(rag.ingest_queue.jobs()) == 2
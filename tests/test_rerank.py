@@ -0,0 +1,48 @@
+from app.models import VectorMatch
+from app.rerank import Reranker
+
+QUESTION = "What is the grace period for premium payment?"
+
+def match(text, score):
+    return VectorMatch(id=text[:16], score=score, metadata={'text': text})
+
+def test_decisive_match_is_sent_alone():
+    result = Reranker().rerank(QUESTION, [
+        match("A grace period of thirty days applies to premium payment.", 0.82),
+        match("Hospitalisation must exceed twenty-four hours.", 0.80),
+        match("Ambulance charges are covered up to a limit.", 0.78),
+    ])
+    assert result.found
+    assert [m.id for m in result.matches] == ["A grace period o"]
+    assert len(result.scores) == 1
+
+def test_close_candidates_are_kept_best_first():
+    matches = [
+        match("The grace period for payment is thirty days.", 0.80),
+        match("Premium payment may be made in instalments; a grace period applies.", 0.79),
+        match("Grace period premium rules are listed in section four.", 0.78),
+    ]
+    result = Reranker().rerank(QUESTION, matches)
+    assert result.found
+    assert len(result.matches) > 1
+    assert result.scores == sorted(result.scores, reverse=True)
+    assert all(score >= result.scores[0] * Reranker().keep_ratio for score in result.scores)
+
+def test_max_chunks_caps_what_is_kept():
+    matches = [match(f"Grace period premium payment clause {i} and more", 0.8) for i in range(8)]
+    assert len(Reranker(decisive_margin=1.0).rerank(QUESTION, matches, max_chunks=3).matches) <= 3
+
+def test_irrelevant_candidates_are_reported_not_found():
+    result = Reranker().rerank(QUESTION, [
+        match("Ambulance charges are covered up to a limit.", 0.10),
+        match("Hospitalisation must exceed twenty-four hours.", 0.08),
+    ])
+    assert not result.found
+    assert result.matches == []
+
+def test_low_similarity_with_matching_terms_is_still_answered():
+    result = Reranker().rerank(QUESTION, [match("The grace period is thirty days.", 0.10)])
+    assert result.found
+
+def test_no_candidates():
+    assert not Reranker().rerank(QUESTION, []).found
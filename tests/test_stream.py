@@ -0,0 +1,72 @@
+import asyncio
+import json
+import httpx
+import pytest
+from benchmarks.corpus import generate_pages
+from app import api
+
+QUESTIONS = ["What is the grace period?", "Is maternity covered?", "What is the waiting period?"]
+
+@pytest.fixture
+def client(make_rag, monkeypatch):
+    monkeypatch.setenv("HACKATHON_BEARER_TOKEN", "secret")
+    monkeypatch.setattr(api, "rag_system", make_rag())
+    # In-process ASGI client; the lifespan is not run since the RAG system is already set
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test",
+                             headers={"Authorization": "Bearer secret"})
+
+def stream(client, url, accept=None, **params):
+    headers = {"Accept": accept} if accept else {}
+    
+    async def post():
+        async with client:
+            return await client.post("/hackrx/run/stream", json={"documents": url, "questions": QUESTIONS},
+                                     headers=headers, params=params)
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    return response
+
+def test_ndjson_events_end_with_done(client, serve):
+    response = stream(client, serve("policy.pdf", generate_pages(4)))
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    events = [json.loads(line) for line in response.text.splitlines()]
+    answers = [event for event in events if event["type"] == "answer"]
+    assert sorted(event["index"] for event in answers) == [0, 1, 2]
+    for event in answers:
+        assert event["question"] == QUESTIONS[event["index"]]
+        assert event["answer"].startswith(f"Answer to '{event['question']}'")
+    assert events[-1] == {"type": "done", "answered": 3}
+
+def test_server_sent_events_framing(client, serve):
+    response = stream(client, serve("policy.pdf", generate_pages(4)), accept="text/event-stream")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    frames = response.text.split("\n\n")
+    assert frames[-1] == ""
+    parsed = []
+    for frame in frames[:-1]:
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        event = json.loads(data_line[len("data: "):])
+        assert event["type"] == event_line[len("event: "):]
+        parsed.append(event)
+    assert [event["type"] for event in parsed].count("answer") == 3
+    assert parsed[-1] == {"type": "done", "answered": 3}
+
+def test_tokens_stream_before_each_answer(client, serve):
+    response = stream(client, serve("policy.pdf", generate_pages(4)), stream_tokens="true")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    
+    for index in range(len(QUESTIONS)):
+        own = [event for event in events if event.get("index") == index]
+        assert own[-1]["type"] == "answer"
+        tokens = "".join(event["text"] for event in own[:-1])
+        assert own[:-1] and all(event["type"] == "token" for event in own[:-1])
+        assert tokens.strip() == own[-1]["answer"]
+
+def test_unreachable_document_still_answers_every_question(client, corpus):
+    response = stream(client, f"{corpus.url}/missing.pdf")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["answer"] for event in events[:-1]] == ["Error: Could not process document"] * 3
+    assert events[-1] == {"type": "done", "answered": 3}
@@ -0,0 +1,122 @@
+# tests/test_upstream.py
+import time
+from types import SimpleNamespace
+import pytest
+from benchmarks.fakes import FakeAPIError, FakeOpenAI, LatencyModel
+from app.upstream import CircuitBreaker, CircuitOpen, Endpoint, TokenBucket, UpstreamClient, retryable
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+class Flaky:
+    """Callable that raises the queued errors in order, then succeeds"""
+    
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def endpoint(**kwargs):
+    settings = dict(max_retries=3, backoff_base=0.001, backoff_max=0.01, failure_threshold=3, reset_seconds=0.2)
+    settings.update(kwargs)
+    return Endpoint("test", **settings)
+
+@pytest.fixture
+def upstream():
+    client = UpstreamClient(FakeOpenAI(), embeddings=endpoint(), chat=endpoint())
+    yield client
+    client.close()
+
+def test_retryable_classification():
+    assert retryable(FakeAPIError("connection reset"))
+    assert retryable(StatusError(429))
+    assert retryable(StatusError(503))
+    assert not retryable(StatusError(400))
+    assert not retryable(ValueError("bad input"))
+    assert not retryable(CircuitOpen("open"))
+
+def test_breaker_opens_after_threshold_and_probes_once_after_reset():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.1)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    
+    time.sleep(0.15)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow(), "only one probe while half open"
+    
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+def test_transient_errors_are_retried(upstream):
+    call = Flaky(StatusError(503), FakeAPIError("reset"))
+    assert upstream._call(upstream.chat, 10, call) == "ok"
+    assert call.calls == 3
+    assert upstream.chat.breaker.state == "closed"
+
+def test_client_errors_are_not_retried_and_do_not_trip_breaker(upstream):
+    call = Flaky(StatusError(400), StatusError(400), StatusError(400), StatusError(400))
+    for _ in range(4):
+        with pytest.raises(StatusError):
+            upstream._call(upstream.chat, 10, call)
+    assert call.calls == 4
+    assert upstream.chat.breaker.state == "closed"
+
+def test_open_circuit_fails_fast_then_recovers(upstream):
+    failing = Flaky(*[FakeAPIError("down")] * 10)
+    # The third consecutive failure opens the circuit, which also ends the retries
+    with pytest.raises(CircuitOpen):
+        upstream._call(upstream.embeddings, 10, failing)
+    assert failing.calls == 3
+    assert upstream.embeddings.breaker.state == "open"
+    
+    with pytest.raises(CircuitOpen):
+        upstream._call(upstream.embeddings, 10, failing)
+    assert failing.calls == 3
+    
+    time.sleep(0.25)
+    assert upstream._call(upstream.embeddings, 10, Flaky()) == "ok"
+    assert upstream.embeddings.breaker.state == "closed"
+
+def test_rate_limit_honours_retry_after(upstream):
+    call = Flaky(StatusError(429, {"retry-after": "0.2"}))
+    start = time.monotonic()
+    assert upstream._call(upstream.chat, 10, call) == "ok"
+    assert time.monotonic() - start >= 0.2
+
+def test_token_bucket_delays_beyond_capacity():
+    bucket = TokenBucket(rate_per_minute=600)  # 10 per second, burst of 600
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.05)
+    assert TokenBucket(0).reserve(10 ** 6) == 0.0
+
+def test_embeddings_go_through_the_fake_client(upstream):
+    response = upstream.create_embeddings(2, model="m", input=["a", "b"])
+    assert len(response.data) == 2
+
+def test_slow_chat_call_is_hedged():
+    client = FakeOpenAI(chat_latency=LatencyModel(base_ms=300))
+    upstream = UpstreamClient(client, embeddings=endpoint(), chat=endpoint(hedge_after=0.05))
+    try:
+        upstream.create_chat_completion(10, model="m", messages=[{"role": "user", "content": "Question: q"}])
+        assert client.chat_latency.calls == 2
+    finally:
+        upstream.close()
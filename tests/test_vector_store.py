@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pytest
+from app.vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+def row(seed):
+    values = np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32)
+    return values / np.linalg.norm(values)
+
+def vectors(doc_id, seeds, chunk_index=0):
+    return [{'id': f"{doc_id}_{seed}", 'values': row(seed), 'metadata': {'doc_id': doc_id, 'chunk_index': chunk_index}}
+            for seed in seeds]
+
+def matrix_files(directory, doc_id):
+    return [name for name in os.listdir(directory) if name.startswith(f"{doc_id}.") and name.endswith(".npy")]
+
+def test_buffered_upserts_are_searchable_before_flush(tmp_path):
+    store = LocalVectorStore(str(tmp_path), DIMENSION)
+    for start in range(0, 40, 8):
+        store.upsert(vectors("doc", range(start, start + 8)))
+    
+    assert store.fetch(["doc_5"], doc_id="doc")["doc_5"] == pytest.approx(row(5))
+    assert store.query(row(17), top_k=1, doc_id="doc")[0].id == "doc_17"
+    assert matrix_files(tmp_path, "doc") == []
+    
+    store.flush()
+    assert len(matrix_files(tmp_path, "doc")) == 1
+    assert len(store._documents["doc"].ids) == 40
+
+def test_upsert_replaces_rows_and_metadata(tmp_path):
+    store = LocalVectorStore(str(tmp_path), DIMENSION)
+    store.upsert(vectors("doc", [1, 2]))
+    store.flush()
+    store.upsert([{'id': "doc_1", 'values': row(9), 'metadata': {'doc_id': "doc", 'chunk_index': 7}}])
+    
+    match = store.query(row(9), top_k=1, doc_id="doc")[0]
+    assert match.id == "doc_1" and match.metadata['chunk_index'] == 7
+    assert len(store._current("doc").ids) == 2
+
+def test_another_process_sees_flushed_changes(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), DIMENSION)
+    reader = LocalVectorStore(str(tmp_path), DIMENSION)
+    writer.upsert(vectors("doc", range(5)))
+    writer.flush()
+    assert {match.id for match in reader.query(row(0), top_k=10, doc_id="doc")} == {f"doc_{i}" for i in range(5)}
+    
+    writer.upsert(vectors("doc", [5]))
+    writer.delete(["doc_0"], doc_id="doc")
+    writer.flush()
+    ids = {match.id for match in reader.query(row(0), top_k=10, doc_id="doc")}
+    assert ids == {f"doc_{i}" for i in range(1, 6)}
+    # Superseded matrix files are removed; the reader's earlier memory map stays valid until reload
+    assert len(matrix_files(tmp_path, "doc")) == 1
+
+def test_documents_flushed_elsewhere_are_listed(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), DIMENSION)
+    reader = LocalVectorStore(str(tmp_path), DIMENSION)
+    writer.upsert(vectors("a", [1]) + vectors("b", [2]))
+    writer.flush()
+    
+    assert reader.query(row(2), top_k=1)[0].id == "b_2"
+    assert set(reader.fetch(["a_1", "b_2"])) == {"a_1", "b_2"}